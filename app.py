@@ -5,29 +5,93 @@
 
 import json
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import babel.dates
+import functools
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context, make_response, session, g, has_request_context, before_render_template, template_rendered
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import func, and_, or_, event, inspect, select, bindparam, case, text, DDL
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload, sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from flask_migrate import Migrate
 from forms import *
+from search import NgramIndex, PrefixIndex, escape_like
+from cache import create_cache, PageCache, FragmentCacheExtension
+from instrument import RequestStats, Metrics
+from intervals import IntervalIndex
+from geo import Geocoder, GridIndex, bounding_box, EARTH_RADIUS_MILES
 import datetime
-import sys 
+import click
+import hmac
+import hashlib
+import threading
+import time
+import random
+import cProfile
+import os
+import io
+import gzip
+import heapq
+import bulk
+import datagen
+import availability
+try:
+  import orjson
+except ImportError:
+  orjson = None
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
+try:
+  from flask import stream_template
+except ImportError:
+  # Flask < 2.2 has no stream_template; render the same way it does.
+  def stream_template(template_name, **context):
+    app.update_template_context(context)
+    return stream_with_context(app.jinja_env.get_template(template_name).stream(context))
+
+# engine options that only make sense for a connection pool
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+class RoutingSession(SignallingSession):
+    # sends reads to the replica bind chosen by @read_only, if any, and
+    # everything else (flushes included) to the mapper's usual bind
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica_bind') if has_request_context() else None
+        if replica is not None and not self._flushing:
+            return db.get_engine(self.app, bind=replica)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        # SQLite gets no queue pool, so it takes none of its options
+        if sa_url.drivername.startswith('sqlite'):
+            engine_opts = {key: value for key, value in engine_opts.items() if key not in POOL_OPTIONS}
+        return SQLAlchemy.create_engine(self, sa_url, engine_opts)
+
+
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 
-# TODO: connect to a local postgresql database
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+detail_cache = create_cache(app.config)
+page_cache = PageCache(app.config['PAGE_CACHE_MAX_BYTES'], app.config['PAGE_CACHE_TTL'],
+                       app.config['PAGE_CACHE_STALE_TTL'])
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = PageCache(app.config['FRAGMENT_CACHE_MAX_BYTES'],
+                                         app.config['FRAGMENT_CACHE_TTL'])
 
 
 
@@ -35,8 +99,36 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+
+# the (genre_id, <entity>_id) indexes make "everything playing Jazz" an index join
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'city', 'state', name='uq_venue_name_city_state'),
+        db.Index('ix_venue_city_state', 'city', 'state'),
+        db.Index('ix_venue_updated_at', 'updated_at'),
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -46,10 +138,19 @@ class Venue(db.Model):
     phone = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre', secondary=venue_genres, lazy=True, order_by=Genre.name)
     website = db.Column(db.String(120), nullable=False)
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(200), nullable=False)
+    # materialized, see count_upcoming_show() and refresh_upcoming_counts()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow, server_default=func.now())
+    # the centroid of the city, see locate_venue(). On PostgreSQL a GiST index
+    # on point(longitude, latitude) (see the venue_location migration) serves
+    # the nearby queries.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     shows = db.relationship('Show', backref='venues', lazy=True, cascade='all, delete-orphan')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -58,6 +159,12 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'city', 'state', name='uq_artist_name_city_state'),
+        db.Index('ix_artist_updated_at', 'updated_at'),
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -66,52 +173,100 @@ class Artist(db.Model):
     phone = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre', secondary=artist_genres, lazy=True, order_by=Genre.name)
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(200), nullable=False)
     website = db.Column(db.String(120), nullable=False)
+    # materialized, see count_upcoming_show() and refresh_upcoming_counts()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow, server_default=func.now())
     shows = db.relationship('Show', backref='artists', lazy=True, cascade='all, delete-orphan')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 class Show(db.Model):
   __tablename__ = 'Show'
+  # detail pages filter on venue_id/artist_id plus a start_time comparison,
+  # and /shows seeks on (start_time, id). On PostgreSQL the SHOW_NO_OVERLAP
+  # exclusion constraints below keep a venue's and an artist's
+  # [start_time, end_time) periods from overlapping.
+  __table_args__ = (
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    db.Index('ix_show_updated_at', 'updated_at'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
-  start_time = db.Column(db.DateTime(), nullable=False)
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-
+  # active_history loads the previous value when one of these changes, even
+  # on an expired show, for count_updated_show() and the detail cache keys
+  start_time = db.column_property(db.Column(db.DateTime(), nullable=False), active_history=True)
+  # minutes; end_time is derived from it by set_show_end_time()
+  duration = db.Column(db.Integer, nullable=False, server_default='120')
+  end_time = db.Column(db.DateTime(), nullable=False)
+  venue_id = db.column_property(db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False),
+                                active_history=True)
+  artist_id = db.column_property(db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False),
+                                 active_history=True)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                         onupdate=datetime.datetime.utcnow, server_default=func.now())
+
+  # the display properties read the artist and venue through the backrefs, so
+  # shows loaded with hydrate_shows() serialize without any per-row query.
   @property
   def display_show(self):
-    artist = Artist.query.filter(Artist.id==self.artist_id).one()
-    venue = Venue.query.filter(Venue.id==self.venue_id).one()
     return {
       'venue_id': self.venue_id,
-      'venue_name': venue.name,
+      'venue_name': self.venues.name,
       'artist_id': self.artist_id,
-      'artist_name' : artist.name,
-      'artist_image_link' : artist.image_link,
-      'start_time': convert_datetime_string(self.start_time)}
+      'artist_name' : self.artists.name,
+      'artist_image_link' : self.artists.image_link,
+      'start_time': self.start_time}
   
   @property
   def display_show_venue(self):
-    artist = Artist.query.filter(Artist.id==self.artist_id).one()
     return {
       'artist_id': self.artist_id,
-      'artist_name' : artist.name,
-      'artist_image_link' : artist.image_link,
-      'start_time': convert_datetime_string(self.start_time)}
+      'artist_name' : self.artists.name,
+      'artist_image_link' : self.artists.image_link,
+      'start_time': self.start_time}
 
   @property
   def display_show_artist(self):
-    venue = Venue.query.filter(Venue.id==self.venue_id).one()
     return {
       'venue_id': self.venue_id,
-      'venue_name' : venue.name,
-      'venue_image_link' : venue.image_link,
-      'start_time':  convert_datetime_string(self.start_time)}
-    
-
+      'venue_name' : self.venues.name,
+      'venue_image_link' : self.venues.image_link,
+      'start_time': self.start_time}
+
+# the constraints of the show_end_time migration, also made by create_all().
+# SQLite cannot express them (ExcludeConstraint does not compile there), so
+# they are PostgreSQL-only DDL, as are the extensions behind them and the
+# trigram name indexes.
+SHOW_NO_OVERLAP = [
+  ('show_venue_no_overlap', 'venue_id'),
+  ('show_artist_no_overlap', 'artist_id'),
+]
+
+for extension in ('pg_trgm', 'btree_gist'):
+  event.listen(db.Model.metadata, 'before_create',
+               DDL('CREATE EXTENSION IF NOT EXISTS {}'.format(extension)).execute_if(dialect='postgresql'))
+for name, column in SHOW_NO_OVERLAP:
+  event.listen(Show.__table__, 'after_create',
+               DDL('ALTER TABLE "Show" ADD CONSTRAINT {} EXCLUDE USING gist '
+                   '({} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, column))
+               .execute_if(dialect='postgresql'))
+
+
+class FacetCount(db.Model):
+  # cached number of venues/artists per genre, state and seeking flag, kept
+  # current by the write handlers and rebuilt by `flask rebuild-facets`.
+  __tablename__ = 'FacetCount'
+
+  entity = db.Column(db.String(20), primary_key=True)
+  facet = db.Column(db.String(20), primary_key=True)
+  value = db.Column(db.String(120), primary_key=True)
+  count = db.Column(db.Integer, nullable=False, default=0)
 
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -125,21 +280,1441 @@ class Show(db.Model):
 def convert_string_datetime(datetime_str):
   return datetime.datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S")
 
-def convert_datetime_string(datetime):
-  return datetime.strftime( "%Y-%m-%d %H:%M:%S")
-  
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=64)
+def datetime_pattern(format):
+  # compiled babel pattern, built once per format
+  return babel.dates.parse_pattern(format)
+
+@functools.lru_cache(maxsize=8)
+def babel_locale(identifier):
+  return babel.Locale.parse(identifier)
+
+def format_datetime(value, format='medium', locale=None):
+  # templates receive real datetimes; strings are still accepted for callers
+  # that serialized them. The locale defaults to BABEL_DEFAULT_LOCALE rather
+  # than the environment, which often sets none.
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  locale = babel_locale(locale or app.config.get('BABEL_DEFAULT_LOCALE', 'en_US'))
+  return babel.dates.format_datetime(value, datetime_pattern(DATETIME_FORMATS.get(format, format)), locale=locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
 
+#----------------------------------------------------------------------------#
+# Loaders.
+#----------------------------------------------------------------------------#
+
+def get_genres(names):
+  # returns the Genre rows for names, creating the ones not seen before. New
+  # names are upserted like the facet counts, so two writers introducing the
+  # same genre both get its row instead of one failing on the unique name.
+  names = list(dict.fromkeys(str(name) for name in names))
+  genres = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))}
+  missing = sorted(name for name in names if name not in genres)
+  insert = UPSERTS.get(db.engine.dialect.name)
+  if missing and insert is not None:
+    db.session.execute(insert(Genre.__table__).values([dict(name=name) for name in missing])
+                       .on_conflict_do_nothing(index_elements=[Genre.__table__.c.name]))
+    genres.update((genre.name, genre) for genre in Genre.query.filter(Genre.name.in_(missing)))
+  for name in missing:
+    if name not in genres:
+      genres[name] = Genre(name=name)
+      db.session.add(genres[name])
+  return [genres[name] for name in names]
+
+FACET_ENTITIES = {'venues': Venue, 'artists': Artist}
+
+def seeking_column(model):
+  return model.seeking_talent if model is Venue else model.seeking_venue
+
+def facets_of(obj):
+  # the (facet, value) pairs a venue or artist is counted under
+  seeking = obj.seeking_talent if isinstance(obj, Venue) else obj.seeking_venue
+  facets = {('state', obj.state), ('seeking', 'yes' if seeking else 'no')}
+  facets.update(('genre', genre.name) for genre in obj.genres)
+  return facets
+
+# INSERT ... ON CONFLICT DO UPDATE, per dialect
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def update_facet_counts(entity, before, after):
+  # applies the change between two facet sets to the cached counts, inside the
+  # caller's transaction so the counts commit or roll back with the record.
+  # Each count is one upsert, so two writers introducing the same new genre
+  # or state both add to it instead of one failing on the primary key; they
+  # take the rows in the same order, so they cannot deadlock either.
+  insert = UPSERTS.get(db.engine.dialect.name)
+  table = FacetCount.__table__
+  for delta, facets in ((1, after - before), (-1, before - after)):
+    for facet, value in sorted(facets):
+      if insert is not None:
+        statement = insert(table).values(entity=entity, facet=facet, value=value, count=delta)
+        db.session.execute(statement.on_conflict_do_update(
+          index_elements=[table.c.entity, table.c.facet, table.c.value],
+          set_=dict(count=table.c.count + delta)))
+        continue
+      row = FacetCount.query.get((entity, facet, value))
+      if row is None:
+        db.session.add(FacetCount(entity=entity, facet=facet, value=value, count=delta))
+      else:
+        row.count = FacetCount.count + delta
+
+def rebuild_facet_counts():
+  FacetCount.query.delete()
+  for entity, model in FACET_ENTITIES.items():
+    seeking = seeking_column(model)
+    counts = [('state', value, count) for value, count in
+              db.session.query(model.state, func.count(model.id)).group_by(model.state)]
+    counts += [('seeking', 'yes' if value else 'no', count) for value, count in
+               db.session.query(seeking, func.count(model.id)).group_by(seeking)]
+    counts += [('genre', value, count) for value, count in
+               db.session.query(Genre.name, func.count(model.id)).join(model.genres).group_by(Genre.name)]
+    db.session.add_all([FacetCount(entity=entity, facet=facet, value=value, count=count)
+                        for facet, value, count in counts])
+  db.session.commit()
+
+def facet_filters(model, args):
+  # criteria for the ?genre=&state=&seeking= listing filters; genres combine with AND
+  criteria = [model.genres.any(Genre.name == genre) for genre in args.getlist('genre')]
+  if args.get('state'):
+    criteria.append(model.state == args['state'])
+  if args.get('seeking') in ('yes', 'no'):
+    criteria.append(seeking_column(model) == (args['seeking'] == 'yes'))
+  return criteria
+
+def facet_links(entity, args):
+  # the cached count of every facet value, each with the URL toggling it in the filters
+  links = {}
+  rows = FacetCount.query.filter(FacetCount.entity == entity, FacetCount.count > 0) \
+    .order_by(FacetCount.facet, FacetCount.value)
+  for row in rows:
+    selected = args.getlist(row.facet)
+    params = args.to_dict(flat=False)
+    if row.value in selected:
+      params[row.facet] = [value for value in selected if value != row.value]
+    elif row.facet == 'genre':
+      params[row.facet] = selected + [row.value]
+    else:
+      params[row.facet] = [row.value]
+    links.setdefault(row.facet, []).append(dict(value=row.value, count=row.count,
+                                                active=row.value in selected,
+                                                url=url_for(request.endpoint, **params)))
+  return links
+
+def hydrate_shows(query):
+  # eager loads the artist and venue of every show in the same SELECT, so the
+  # display_show* properties never go back to the database per row.
+  return query.options(joinedload(Show.artists), joinedload(Show.venues))
+
+class ShowPage(object):
+  # one keyset page of /shows. Rows are serialized while the template streams
+  # them, and the cursor of the following page is known once the page is spent.
+  def __init__(self, query, per_page):
+    self.query = query
+    self.per_page = per_page
+    self.next_cursor = None
+
+  def __iter__(self):
+    last = None
+    for count, show in enumerate(self.query.limit(self.per_page + 1)):
+      if count == self.per_page:
+        self.next_cursor = encode_show_cursor(last)
+        break
+      last = show
+      yield show.display_show
+
+def encode_show_cursor(show):
+  return '{}_{}'.format(show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%f'), show.id)
+
+def decode_show_cursor(cursor):
+  start_time, _, id = cursor.rpartition('_')
+  return datetime.datetime.strptime(start_time, '%Y-%m-%dT%H:%M:%S.%f'), int(id)
+
+def load_show_page(after=None, upcoming=False):
+  # seeks on (start_time, id) instead of OFFSET, so every page costs the same
+  # no matter how deep into the listing it is.
+  return ShowPage(show_page_query(hydrate_shows(Show.query), after, upcoming), app.config['SHOWS_PER_PAGE'])
+
+def show_page_query(query, after=None, upcoming=False):
+  # the keyset filter and order of a /shows page, applied to any query over Show
+  if upcoming:
+    query = query.filter(Show.start_time > datetime.datetime.now())
+  if after:
+    start_time, id = decode_show_cursor(after)
+    query = query.filter(or_(Show.start_time > start_time,
+                             and_(Show.start_time == start_time, Show.id > id)))
+  return query.order_by(Show.start_time, Show.id)
+
+def split_shows(shows):
+  # splits (start_time, display dict) pairs into past and upcoming against a
+  # single captured `now`, so the lists and their counts always agree.
+  now = datetime.datetime.now()
+  past_shows = []
+  upcoming_shows = []
+  for start_time, show in shows:
+    if start_time > now:
+      upcoming_shows.append(show)
+    else:
+      past_shows.append(show)
+  return past_shows, upcoming_shows
+
+def with_split_shows(detail):
+  # a detail dict with its shows split into the past/upcoming lists and counts
+  # the venue and artist pages (and the API) expect
+  data = dict(detail)
+  past_shows, upcoming_shows = split_shows(data.pop('shows'))
+  data.update(past_shows=past_shows,
+              upcoming_shows=upcoming_shows,
+              past_shows_count=len(past_shows),
+              upcoming_shows_count=len(upcoming_shows))
+  return data
+
+# the fields of the venue and artist pages, in page order
+DETAIL_FIELDS = {
+  'venue': ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+            'seeking_talent', 'seeking_description', 'image_link'),
+  'artist': ('id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'facebook_link',
+             'seeking_venue', 'seeking_description', 'image_link'),
+}
+
+def detail_relations(model):
+  # (genre association key, the show column pointing at model, the model on the
+  # other side of its shows and the show column pointing there)
+  if model is Venue:
+    return venue_genres.c.venue_id, Show.venue_id, Artist, Show.artist_id
+  return artist_genres.c.artist_id, Show.artist_id, Venue, Show.venue_id
+
+def detail_statements(model, id):
+  # the entity, its genre names and its shows with their counterparts, as three
+  # independent statements (asgi.py runs them concurrently)
+  genre_key, show_column, counterpart, counterpart_column = detail_relations(model)
+  entity = select([model.__table__]).where(model.id == id)
+  genres = select([Genre.name]) \
+    .select_from(Genre.__table__.join(genre_key.table)) \
+    .where(genre_key == id) \
+    .order_by(Genre.name)
+  shows = select([Show.start_time, counterpart.id, counterpart.name, counterpart.image_link]) \
+    .select_from(Show.__table__.join(counterpart.__table__, counterpart.id == counterpart_column)) \
+    .where(show_column == id) \
+    .order_by(Show.start_time)
+  return entity, genres, shows
+
+def build_detail(model, entity, genres, shows):
+  # the detail dict of venue_detail()/artist_detail() from the rows of
+  # detail_statements(); shows are (start_time, display dict) pairs
+  fields = DETAIL_FIELDS['venue' if model is Venue else 'artist']
+  other = 'artist' if model is Venue else 'venue'
+  data = {field: [name for name, in genres] if field == 'genres' else getattr(entity, field)
+          for field in fields}
+  data['shows'] = [(start_time, {other + '_id': id, other + '_name': name,
+                                 other + '_image_link': image_link, 'start_time': start_time})
+                   for start_time, id, name, image_link in shows]
+  return data
+
+def load_detail(model, id):
+  entity, genres, shows = detail_statements(model, id)
+  entity = db.session.execute(entity).first()
+  if entity is None:
+    abort(404)
+  return build_detail(model, entity, db.session.execute(genres), db.session.execute(shows))
+
+def venue_detail(venue_id):
+  # the serialized venue with all of its shows. Served from detail_cache until
+  # a commit touches the venue, one of its shows or an artist playing there.
+  return cached_detail('venue:{}'.format(venue_id), Venue, venue_id)
+
+def artist_detail(artist_id):
+  # the serialized artist with all of its shows, cached like venue_detail()
+  return cached_detail('artist:{}'.format(artist_id), Artist, artist_id)
+
+def cached_detail(key, model, id):
+  # entries carry the ETag the page was validated with when they were loaded;
+  # loading after validating means the data is never older than that ETag
+  if reading_own_writes():
+    return load_detail(model, id)
+  etag = g.get('etag')
+  data = cached_detail_entry(key, etag)
+  if data is None:
+    data = load_detail(model, id)
+    detail_cache.set(key, (etag, data))
+  return data
+
+def cached_detail_entry(key, etag):
+  # the cached data of key if it was loaded under etag, so a body refilled by
+  # a request that raced a commit never goes out under the newer ETag. Without
+  # an ETag (the API, the edit forms) any entry will do.
+  entry = detail_cache.get(key)
+  if entry is None or etag is not None and entry[0] != etag:
+    return None
+  return entry[1]
+
+def upcoming_parents(start_time, venue_id, artist_id):
+  # the venue and artist whose upcoming_shows_count a show adds to
+  if start_time > datetime.datetime.now():
+    return [(Venue, venue_id), (Artist, artist_id)]
+  return []
+
+def count_upcoming_show(connection, removed=(), added=()):
+  # keeps the materialized upcoming_shows_count columns current as shows are
+  # inserted, updated or deleted, in the same transaction as the show itself
+  deltas = {}
+  for delta, parents in ((-1, removed), (1, added)):
+    for parent in parents:
+      deltas[parent] = deltas.get(parent, 0) + delta
+  for (model, id), delta in deltas.items():
+    if delta:
+      connection.execute(model.__table__.update()
+                         .where(model.id == id)
+                         .values(upcoming_shows_count=model.upcoming_shows_count + delta))
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, target):
+  count_upcoming_show(connection, added=upcoming_parents(target.start_time, target.venue_id, target.artist_id))
+
+@event.listens_for(Show, 'after_update')
+def count_updated_show(mapper, connection, target):
+  # a show moved in time or to another venue or artist leaves the counts of
+  # its old parents and joins those of the new ones
+  state = inspect(target)
+  before = []
+  for name in ('start_time', 'venue_id', 'artist_id'):
+    history = state.attrs[name].history
+    before.append(history.deleted[0] if history.deleted else getattr(target, name))
+  count_upcoming_show(connection, removed=upcoming_parents(*before),
+                      added=upcoming_parents(target.start_time, target.venue_id, target.artist_id))
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, target):
+  count_upcoming_show(connection, removed=upcoming_parents(target.start_time, target.venue_id, target.artist_id))
+
+def refresh_upcoming_counts():
+  # recomputes every upcoming_shows_count, which ages shows from upcoming to
+  # past as time passes, and commits
+  update_upcoming_counts()
+  db.session.commit()
+
+def update_upcoming_counts(ids=None):
+  # recomputes upcoming_shows_count in the caller's transaction. ids
+  # optionally restricts it to {model: [ids]}; only rows whose count actually
+  # changed are written.
+  now = datetime.datetime.now()
+  for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    upcoming = select([func.count(Show.id)]) \
+      .where(and_(column == model.id, Show.start_time > now)) \
+      .as_scalar()
+    update = model.__table__.update() \
+      .where(model.upcoming_shows_count != upcoming) \
+      .values(upcoming_shows_count=upcoming)
+    if ids is not None:
+      if not ids.get(model):
+        continue
+      update = update.where(model.id.in_(ids[model]))
+    db.session.execute(update)
+
+def apply_on_commit(key, collect, apply):
+  # keeps in-process state in step with committed data only. collect(session)
+  # runs after every flush and its items pile up in session.info[key];
+  # apply(items) gets them once the transaction commits, and a rollback drops
+  # them, so rolled back changes never reach the caches and indexes.
+  def collect_flushed(session, flush_context):
+    pending_on_commit(session, key).extend(collect(session))
+
+  def apply_committed(session):
+    items = session.info.pop(key, None)
+    if items:
+      apply(items)
+
+  def discard(session):
+    session.info.pop(key, None)
+
+  event.listen(db.session, 'after_flush', collect_flushed)
+  event.listen(db.session, 'after_commit', apply_committed)
+  event.listen(db.session, 'after_rollback', discard)
+
+def pending_on_commit(session, key):
+  # the items the session's transaction hands to the apply_on_commit() key
+  # when it commits; core statements, which flush nothing, add theirs here
+  return session.info.setdefault(key, [])
+
+def collect_cache_keys(session):
+  # the detail pages made stale by this flush
+  keys = set()
+  for obj in session.dirty:
+    # a renamed venue or artist also shows up on its counterparts' pages
+    if isinstance(obj, (Venue, Artist)):
+      keys.update(counterpart_cache_keys(session, type(obj), [obj.id]))
+  for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+    if isinstance(obj, Venue):
+      keys.add('venue:{}'.format(obj.id))
+    elif isinstance(obj, Artist):
+      keys.add('artist:{}'.format(obj.id))
+    elif isinstance(obj, Show):
+      state = inspect(obj)
+      for id in state.attrs.venue_id.history.sum() or [obj.venue_id]:
+        keys.add('venue:{}'.format(id))
+      for id in state.attrs.artist_id.history.sum() or [obj.artist_id]:
+        keys.add('artist:{}'.format(id))
+  return keys
+
+def counterpart_cache_keys(session, model, ids):
+  # the detail pages of the artists playing at these venues, or of the venues
+  # these artists play, which show their names and images
+  if model is Venue:
+    own, other, prefix = Show.venue_id, Show.artist_id, 'artist:'
+  else:
+    own, other, prefix = Show.artist_id, Show.venue_id, 'venue:'
+  keys = set()
+  for chunk in bulk.batched(ids, ID_CHUNK_SIZE):
+    keys.update(prefix + str(id) for id, in session.execute(select([other]).where(own.in_(chunk)).distinct()))
+  return keys
+
+def invalidate_cache_keys(keys):
+  detail_cache.delete(*set(keys))
+
+apply_on_commit('detail_cache_keys', collect_cache_keys, invalidate_cache_keys)
+
+# in-process name indexes: n-gram indexes back search when the database has no
+# pg_trgm, prefix indexes back autocomplete. Each is built on first use and then
+# kept current on commit.
+name_indexes = {}
+prefix_indexes = {}
+
+def name_index(model):
+  index = name_indexes.get(model)
+  if index is None:
+    index = NgramIndex()
+    for id, name in db.session.query(model.id, model.name):
+      index.add(id, name)
+    name_indexes[model] = index
+  return index
+
+def prefix_index(model):
+  index = prefix_indexes.get(model)
+  if index is None:
+    index = prefix_indexes[model] = PrefixIndex(db.session.query(model.id, model.name))
+  return index
+
+def collect_names(session):
+  # the (model, id, name) changes of this flush, a None name for a deletion;
+  # nothing while no index is built
+  names = []
+  if not name_indexes and not prefix_indexes:
+    return names
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, (Venue, Artist)):
+      names.append((type(obj), obj.id, obj.name))
+  for obj in session.deleted:
+    if isinstance(obj, (Venue, Artist)):
+      names.append((type(obj), obj.id, None))
+  return names
+
+def apply_names(names):
+  for model, id, name in names:
+    for indexes in (name_indexes, prefix_indexes):
+      index = indexes.get(model)
+      if index is None:
+        continue
+      if name is None:
+        index.discard(id)
+      else:
+        index.add(id, name)
+
+apply_on_commit('index_names', collect_names, apply_names)
+
+def search_by_name(model, search_term):
+  # case-insensitive partial match on name. On PostgreSQL the matches, their
+  # upcoming show counts and the total match count (a window function) come
+  # back from one statement served by the pg_trgm index; elsewhere the n-gram
+  # index picks the ids.
+  limit = app.config['SEARCH_RESULTS_LIMIT']
+  query = db.session.query(model.id, model.name, model.upcoming_shows_count, func.count().over()) \
+    .order_by(model.name, model.id)
+  if db.engine.dialect.name == 'postgresql':
+    query = query.filter(model.name.ilike('%' + escape_like(search_term) + '%', escape='\\'))
+    rows = query.limit(limit).all()
+    count = rows[0][3] if rows else 0
+  else:
+    ids = name_index(model).search(search_term)
+    rows = query.filter(model.id.in_(ids[:limit])).all()
+    count = len(ids)
+  data = [dict(id=id, name=name, num_upcoming_shows=num_upcoming_shows)
+          for id, name, num_upcoming_shows, total in rows]
+  return dict(count=count, data=data)
+
+def load_venue_areas(criteria=()):
+  # builds the /venues areas from one query over the venues and their
+  # materialized upcoming show counts, grouped into city/state areas in Python.
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                          Venue.upcoming_shows_count) \
+    .filter(*criteria) \
+    .order_by(Venue.state, Venue.city, Venue.id) \
+    .all()
+  areas = {}
+  for id, name, city, state, num_upcoming_shows in rows:
+    area = areas.get((city, state))
+    if area is None:
+      area = areas[(city, state)] = dict(city=city, state=state, venues=[])
+    area['venues'].append(dict(id=id, name=name, num_upcoming_shows=num_upcoming_shows))
+  return list(areas.values())
+
+
+#----------------------------------------------------------------------------#
+# Instrumentation.
+#----------------------------------------------------------------------------#
+
+metrics = Metrics()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+  duration = time.perf_counter() - conn.info['query_start_time'].pop()
+  stats = current_request_stats()
+  if stats is not None:
+    stats.record_query(statement, duration)
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+  stats = current_request_stats()
+  if stats is not None:
+    stats.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_render(sender, template, context, **extra):
+  stats = current_request_stats()
+  if stats is not None and stats.render_started is not None:
+    stats.render_time += time.perf_counter() - stats.render_started
+    stats.render_started = None
+
+def current_request_stats():
+  # the stats live in the WSGI environ rather than on g: asgi.py pushes a new
+  # context, and so a new g, for each step of one request
+  if has_request_context():
+    return request.environ.get('fyyur.request_stats')
+  return None
+
+@app.before_request
+def start_request_stats():
+  stats = request.environ['fyyur.request_stats'] = RequestStats()
+  if random.random() < app.config['PROFILE_SAMPLE_RATE']:
+    stats.profiler = cProfile.Profile()
+    stats.profiler.enable()
+
+@app.after_request
+def finish_request_stats(response):
+  # a streamed body (/shows) only runs its queries and templates while the
+  # server reads it, so the request is accounted for when the response is
+  # closed. Server-Timing has to go out with the headers: it is only sent for
+  # bodies that are complete by now.
+  stats = request.environ.get('fyyur.request_stats')
+  if stats is None:
+    return response
+  if not response.is_streamed:
+    response.headers['Server-Timing'] = stats.server_timing(time.perf_counter() - stats.started)
+  endpoint, method, path = request.endpoint or 'none', request.method, request.path
+  response.call_on_close(functools.partial(
+    close_request_stats, stats, endpoint, method, path, response.status_code))
+  return response
+
+def close_request_stats(stats, endpoint, method, path, status):
+  # runs outside the request context, once the server is done with the body
+  duration = time.perf_counter() - stats.started
+  if stats.profiler is not None:
+    stats.profiler.disable()
+    if duration >= app.config['PROFILE_THRESHOLD']:
+      dump_profile(stats.profiler, duration, endpoint, method, path)
+  duplicates = stats.duplicates(app.config['SQL_DUPLICATE_THRESHOLD'])
+  for statement, count in duplicates:
+    app.logger.warning('%s %s ran the same statement %d times: %s', method, path, count, statement)
+  metrics.observe(endpoint, method, status, duration, stats, len(duplicates))
+
+def dump_profile(profiler, duration, endpoint, method, path):
+  # one .prof file per slow request, readable with pstats or snakeviz
+  os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+  filename = os.path.join(app.config['PROFILE_DIR'], '{:%Y%m%dT%H%M%S%f}-{}-{:.0f}ms.prof'.format(
+    datetime.datetime.now(), endpoint, duration * 1000))
+  profiler.dump_stats(filename)
+  app.logger.info('%s %s took %.0f ms, profile written to %s', method, path, duration * 1000, filename)
+
+
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+def conditional(validator):
+  # answers If-None-Match / If-Modified-Since with a 304 before the view runs.
+  # validator takes the view arguments and returns the parts the page depends
+  # on plus its last modification time, or None to skip validation. The ETag
+  # is left in g.etag, which the page and detail caches key their entries on.
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+      validators = validator(**kwargs)
+      if validators is None:
+        return view(**kwargs)
+      etag, not_modified = check_validators(*validators)
+      g.etag = etag
+      # a pending flash message must reach the page, so never answer 304 or
+      # let the client keep the flashed page then
+      if '_flashes' in session:
+        return view(**kwargs)
+      response = Response(status=304) if not_modified else make_response(view(**kwargs))
+      return set_validators(response, etag, validators[1])
+    return wrapper
+  return decorator
+
+def check_validators(parts, last_modified):
+  # the ETag of parts, and whether the request's If-None-Match or
+  # If-Modified-Since shows the client already has that version
+  etag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+  not_modified = request.if_none_match.contains(etag) or (
+    not request.if_none_match and last_modified is not None and
+    request.if_modified_since is not None and
+    last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None))
+  return etag, not_modified
+
+def set_validators(response, etag, last_modified):
+  response.set_etag(etag)
+  if last_modified is not None:
+    response.last_modified = last_modified
+  response.cache_control.no_cache = True
+  return response
+
+def listing_validators(*models):
+  # the latest change and row count of each model behind a listing page, as
+  # one scalar subquery per aggregate so the tables are never joined
+  row = db.session.query(*[select([aggregate]).as_scalar() for model in models for aggregate in
+                           (func.max(model.updated_at), func.count(model.id))]).one()
+  changes = [value for value in row[::2] if value is not None]
+  return tuple(row), max(changes) if changes else None
+
+def venues_validators():
+  return listing_validators(Venue)
+
+def artists_validators():
+  return listing_validators(Artist)
+
+def shows_validators():
+  # the shows of the page being served and the latest change of them, their
+  # artists and their venues: the same index seek as the page itself, rather
+  # than counts over whole tables. With ?upcoming=1 the ids move as shows start.
+  try:
+    query = show_page_query(
+      db.session.query(Show.id, Show.updated_at, Artist.updated_at, Venue.updated_at)
+        .join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id),
+      request.args.get('after'), request.args.get('upcoming') == '1')
+  except ValueError:
+    # a malformed cursor: the view answers 400
+    return None
+  rows = query.limit(app.config['SHOWS_PER_PAGE'] + 1).all()
+  last_modified = max(value for row in rows for value in row[1:]) if rows else None
+  return (tuple(row[0] for row in rows), last_modified), last_modified
+
+def detail_validator_statements(model, id):
+  # the entity's updated_at, and the latest change, number and upcoming count
+  # of its shows and their counterparts
+  genre_key, show_column, counterpart, counterpart_column = detail_relations(model)
+  updated_at = select([model.updated_at]).where(model.id == id)
+  shows = select([func.max(Show.updated_at), func.max(counterpart.updated_at), func.count(Show.id),
+                  func.sum(case([(Show.start_time > datetime.datetime.now(), 1)], else_=0))]) \
+    .select_from(Show.__table__.join(counterpart.__table__, counterpart.id == counterpart_column)) \
+    .where(show_column == id)
+  return updated_at, shows
+
+def detail_validator_parts(updated_at, shows):
+  # validators from the results of detail_validator_statements(); the
+  # past/upcoming split moves with time, hence the upcoming count
+  if updated_at is None:
+    return None
+  changes = [value for value in (updated_at,) + tuple(shows[:2]) if value is not None]
+  return (updated_at,) + tuple(shows), max(changes)
+
+def detail_validators(model, id):
+  updated_at, shows = detail_validator_statements(model, id)
+  return detail_validator_parts(db.session.execute(updated_at).scalar(), db.session.execute(shows).first())
+
+def venue_validators(venue_id):
+  return detail_validators(Venue, venue_id)
+
+def artist_validators(artist_id):
+  return detail_validators(Artist, artist_id)
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def cached_page(view):
+  # serves anonymous GETs from page_cache, keyed on the route, query string and
+  # the ETag @conditional computed, so a cached body always matches the ETag
+  # it goes out with. Pages with a pending flash message or no ETag, and
+  # clients reading their own writes, bypass the cache. A stale page is served while one background render refreshes it.
+  @functools.wraps(view)
+  def wrapper(**kwargs):
+    etag = g.get('etag')
+    if etag is None or '_flashes' in session or request.authorization is not None or reading_own_writes():
+      return view(**kwargs)
+    key = 'page:{}:{}'.format(etag, request.full_path)
+    page, refresh = page_cache.get(key)
+    if page is None:
+      return render_page(key, view, kwargs)
+    if refresh:
+      threading.Thread(target=refresh_page, args=(key, view, kwargs, request.full_path), daemon=True).start()
+    body, mimetype = page
+    return Response(body, mimetype=mimetype)
+  return wrapper
+
+def render_page(key, view, kwargs):
+  # renders the view and stores the body once it has been sent, without giving
+  # up streaming for streamed templates
+  response = make_response(view(**kwargs))
+  if response.status_code != 200:
+    return response
+  if not response.is_streamed:
+    body = response.get_data()
+    page_cache.set(key, (body, response.mimetype), len(body))
+    return response
+  def tee(chunks):
+    body = []
+    for chunk in chunks:
+      body.append(chunk)
+      yield chunk
+    body = b''.join(body)
+    page_cache.set(key, (body, response.mimetype), len(body))
+  response.response = tee(response.iter_encoded())
+  return response
+
+def refresh_page(key, view, kwargs, path):
+  with app.test_request_context(path):
+    render_page(key, view, kwargs).get_data()
+
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+def read_only(view):
+  # runs the view's queries on a random REPLICA_BINDS replica, unless this
+  # client wrote less than REPLICA_STICKY_SECONDS ago
+  @functools.wraps(view)
+  def wrapper(**kwargs):
+    g.replica_bind = choose_replica()
+    return view(**kwargs)
+  return wrapper
+
+def choose_replica():
+  replicas = app.config['REPLICA_BINDS']
+  if replicas and not reading_own_writes():
+    return random.choice(replicas)
+  return None
+
+def reading_own_writes():
+  # whether this client wrote less than REPLICA_STICKY_SECONDS ago. It then
+  # reads from the primary and bypasses the shared caches: a reader of a
+  # lagging replica may have refilled them right after its commit.
+  return session.get('primary_until', 0) >= time.time()
+
+def remember_write(db_session):
+  if has_request_context():
+    g.wrote = True
+
+event.listen(db.session, 'after_commit', remember_write)
+
+@app.after_request
+def stick_to_primary(response):
+  # a client that has just written reads from the primary for a while, so it
+  # never sees a replica that has not caught up with its own change
+  if g.pop('wrote', False) and app.config['REPLICA_BINDS']:
+    session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+  return response
+
+
+#----------------------------------------------------------------------------#
+# Scheduling.
+#----------------------------------------------------------------------------#
+
+# a show may last up to a day, which also bounds the window an overlap
+# lookup walks in intervals.Timeline
+MAX_SHOW_DURATION = 24 * 60
+
+def parse_duration(value):
+  # minutes as submitted by the form or an import; blank means SHOW_DURATION
+  value = '' if value is None else str(value).strip()
+  if not value:
+    return app.config['SHOW_DURATION']
+  if not value.isdigit() or not 1 <= int(value) <= MAX_SHOW_DURATION:
+    raise ValueError('duration must be between 1 and {} minutes'.format(MAX_SHOW_DURATION))
+  return int(value)
+
+def show_end(start_time, duration):
+  return start_time + datetime.timedelta(minutes=duration)
+
+@event.listens_for(Show, 'before_insert')
+@event.listens_for(Show, 'before_update')
+def set_show_end_time(mapper, connection, target):
+  if target.duration is None:
+    target.duration = app.config['SHOW_DURATION']
+  target.end_time = show_end(target.start_time, target.duration)
+
+def booking_keys(venue_id, artist_id):
+  # the calendars a show occupies
+  return (('venue', venue_id), ('artist', artist_id))
+
+# the venue and artist calendars of every show, for databases without the
+# exclusion constraints. Built on first use, then kept current on commit;
+# core inserts drop it. It only sees this process's commits: without the
+# constraints, two workers can still book the same slot concurrently.
+booking_indexes = {}
+
+def booking_index():
+  index = booking_indexes.get(Show)
+  if index is None:
+    index = IntervalIndex()
+    for id, venue_id, artist_id, start_time, end_time in db.session.query(
+        Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time):
+      index.add(id, booking_keys(venue_id, artist_id), start_time, end_time)
+    booking_indexes[Show] = index
+  return index
+
+def collect_bookings(session):
+  # the (id, keys, start, end) bookings of this flush, None keys for a
+  # deletion; nothing while the index is not built
+  bookings = []
+  if Show not in booking_indexes:
+    return bookings
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, Show):
+      bookings.append((obj.id, booking_keys(obj.venue_id, obj.artist_id), obj.start_time, obj.end_time))
+  for obj in session.deleted:
+    if isinstance(obj, Show):
+      bookings.append((obj.id, None, None, None))
+  return bookings
+
+def apply_bookings(bookings):
+  index = booking_indexes.get(Show)
+  if index is None:
+    return
+  for id, keys, start_time, end_time in bookings:
+    if keys is None:
+      index.discard(id)
+    else:
+      index.add(id, keys, start_time, end_time)
+
+apply_on_commit('show_bookings', collect_bookings, apply_bookings)
+
+# every requested show joined to the stored shows it overlaps, by venue and by
+# artist. Each half is answered by the GiST index of an exclusion constraint.
+OVERLAPPING_SHOWS = text('''
+  WITH requested AS (
+    SELECT * FROM unnest(CAST(:numbers AS integer[]), CAST(:venue_ids AS integer[]),
+                         CAST(:artist_ids AS integer[]), CAST(:start_times AS timestamp[]),
+                         CAST(:end_times AS timestamp[]))
+      AS r (number, venue_id, artist_id, start_time, end_time)
+  )
+  SELECT r.number, 'venue', s.venue_id, s.id, s.start_time, s.end_time
+  FROM requested r JOIN "Show" s ON s.venue_id = r.venue_id
+    AND tsrange(s.start_time, s.end_time) && tsrange(r.start_time, r.end_time)
+  UNION ALL
+  SELECT r.number, 'artist', s.artist_id, s.id, s.start_time, s.end_time
+  FROM requested r JOIN "Show" s ON s.artist_id = r.artist_id
+    AND tsrange(s.start_time, s.end_time) && tsrange(r.start_time, r.end_time)
+''')
+
+def describe_conflict(kind, id, booking, start_time, end_time):
+  return '{} {} is already booked from {} to {} ({})'.format(
+    kind, id, start_time.strftime('%Y-%m-%d %H:%M'), end_time.strftime('%Y-%m-%d %H:%M'), booking)
+
+def show_conflicts(rows):
+  # rows are (number, show columns) pairs; returns {number: [messages]} for
+  # the rows overlapping a stored show of their venue or their artist
+  conflicts = {}
+  if db.engine.dialect.name == 'postgresql':
+    for batch in bulk.batched(rows, app.config['IMPORT_BATCH_SIZE']):
+      overlapping = db.session.execute(OVERLAPPING_SHOWS, dict(
+        numbers=[number for number, row in batch],
+        venue_ids=[row['venue_id'] for number, row in batch],
+        artist_ids=[row['artist_id'] for number, row in batch],
+        start_times=[row['start_time'] for number, row in batch],
+        end_times=[row['end_time'] for number, row in batch]))
+      for number, kind, id, show_id, start_time, end_time in overlapping:
+        conflicts.setdefault(number, []).append(
+          describe_conflict(kind, id, 'show {}'.format(show_id), start_time, end_time))
+    return conflicts
+
+  index = booking_index()
+  for number, row in rows:
+    for (kind, id), show_id, start_time, end_time in index.conflicts(
+        booking_keys(row['venue_id'], row['artist_id']), row['start_time'], row['end_time']):
+      conflicts.setdefault(number, []).append(
+        describe_conflict(kind, id, 'show {}'.format(show_id), start_time, end_time))
+  return conflicts
+
+# venues whose calendars are loaded and searched at a time, and the longest
+# date range one availability query may cover
+AVAILABILITY_CHUNK = 500
+AVAILABILITY_MAX_DAYS = 366
+
+def find_available_venues(windows, length, criteria=(), after=0, limit=None):
+  # venues in id order that are free for length minutes in any of the
+  # (start, end) windows, as (id, name, city, state, slots) tuples, and the
+  # cursor to continue from. Each chunk of venues costs two queries: the
+  # venues, then their shows around the windows in (venue_id, start_time)
+  # index order, which become the sorted timelines of an availability.Calendar.
+  windows = sorted(windows)
+  if not windows:
+    return [], None
+  length = datetime.timedelta(minutes=length)
+  opens, closes = windows[0][0], max(end for start, end in windows)
+  found = []
+  while True:
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state) \
+      .filter(Venue.id > after, *criteria) \
+      .order_by(Venue.id) \
+      .limit(AVAILABILITY_CHUNK) \
+      .all()
+    shows = db.session.query(Show.venue_id, Show.start_time, Show.end_time) \
+      .filter(Show.venue_id.in_([venue.id for venue in venues]),
+              Show.start_time >= opens - datetime.timedelta(minutes=MAX_SHOW_DURATION),
+              Show.start_time < closes, Show.end_time > opens) \
+      .order_by(Show.venue_id, Show.start_time)
+    free = availability.Calendar.from_rows(shows).available([venue.id for venue in venues], windows, length)
+    for id, name, city, state in venues:
+      if id in free:
+        found.append((id, name, city, state, free[id]))
+        if len(found) == limit:
+          return found, id
+    if len(venues) < AVAILABILITY_CHUNK:
+      return found, None
+    after = venues[-1].id
+
+def availability_windows(args):
+  # the windows of ?date=YYYY-MM-DD&days=N&from=HH:MM&until=HH:MM&weekday=fri,
+  # an evening of today by default. Raises ValueError on a malformed value.
+  first_day = datetime.datetime.strptime(args['date'], '%Y-%m-%d').date() if args.get('date') \
+    else datetime.date.today()
+  days = int(args.get('days', 1))
+  if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+    raise ValueError('days must be between 1 and {}'.format(AVAILABILITY_MAX_DAYS))
+  opens = datetime.datetime.strptime(args.get('from', '18:00'), '%H:%M').time()
+  closes = datetime.datetime.strptime(args.get('until', '00:00'), '%H:%M').time()
+  weekdays = None
+  if args.getlist('weekday'):
+    weekdays = {availability.WEEKDAYS.index(day.strip().lower()[:3])
+                for value in args.getlist('weekday') for day in value.split(',')}
+  return list(availability.daily_windows(first_day, days, opens, closes, weekdays))
+
+
+#----------------------------------------------------------------------------#
+# Geography.
+#----------------------------------------------------------------------------#
+
+geocoder = Geocoder.from_csv(app.config['GEOCODER_CENTROIDS'])
+
+def locate_venue(venue):
+  # no network: venues sit on the centroid of their city, or of their state
+  venue.latitude, venue.longitude = geocoder.locate(venue.city, venue.state) or (None, None)
+
+def geocode_venues(everything=False):
+  # locates the venues without a location (all of them with everything), one
+  # UPDATE per distinct (city, state). Returns the number of venues located
+  # and the (city, state, venues) places missing from the centroid table.
+  places = db.session.query(Venue.city, Venue.state, func.count(Venue.id)).group_by(Venue.city, Venue.state)
+  if not everything:
+    places = places.filter(Venue.latitude.is_(None))
+  located = 0
+  missing = []
+  for city, state, count in places.all():
+    point = geocoder.locate(city, state)
+    if point is None:
+      missing.append((city, state, count))
+      continue
+    update = Venue.__table__.update() \
+      .where(and_(Venue.city == city, Venue.state == state)) \
+      .values(latitude=point[0], longitude=point[1])
+    if not everything:
+      update = update.where(Venue.latitude.is_(None))
+    db.session.execute(update)
+    located += count
+  db.session.commit()
+  geo_indexes.clear()
+  return located, missing
+
+# the grid index of venue locations, for databases without the GiST index.
+# Built on first use and kept current on commit; core updates drop it.
+geo_indexes = {}
+
+def venue_grid():
+  index = geo_indexes.get(Venue)
+  if index is None:
+    index = GridIndex()
+    for id, latitude, longitude in db.session.query(Venue.id, Venue.latitude, Venue.longitude) \
+        .filter(Venue.latitude.isnot(None)):
+      index.add(id, latitude, longitude)
+    geo_indexes[Venue] = index
+  return index
+
+def collect_locations(session):
+  # the (id, latitude, longitude) venues of this flush, no coordinates for a
+  # deletion; nothing while the grid is not built
+  locations = []
+  if Venue not in geo_indexes:
+    return locations
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, Venue):
+      locations.append((obj.id, obj.latitude, obj.longitude))
+  for obj in session.deleted:
+    if isinstance(obj, Venue):
+      locations.append((obj.id, None, None))
+  return locations
+
+def apply_locations(locations):
+  index = geo_indexes.get(Venue)
+  if index is None:
+    return
+  for id, latitude, longitude in locations:
+    # add() with no coordinates just drops the venue
+    index.add(id, latitude, longitude)
+
+apply_on_commit('venue_locations', collect_locations, apply_locations)
+
+def venue_location():
+  # the expression the GiST index is built on
+  return func.point(Venue.longitude, Venue.latitude)
+
+def in_box(south, west, north, east):
+  return venue_location().op('<@')(func.box(func.point(west, south), func.point(east, north)))
+
+def miles_from(lat, lng):
+  # haversine distance of the venue from a point, computed by PostgreSQL
+  a = func.power(func.sin(func.radians(Venue.latitude - lat) / 2), 2) + \
+    func.cos(func.radians(lat)) * func.cos(func.radians(Venue.latitude)) * \
+    func.power(func.sin(func.radians(Venue.longitude - lng) / 2), 2)
+  return 2 * EARTH_RADIUS_MILES * func.asin(func.least(1.0, func.sqrt(a)))
+
+LOCATED_COLUMNS = (Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude)
+
+def nearby_venues(lat, lng, radius, limit):
+  # up to limit venues within radius miles, nearest first (then by id), as
+  # (id, name, city, state, latitude, longitude, miles) rows. The bounding box
+  # of the circle is what the spatial index answers.
+  if db.engine.dialect.name == 'postgresql':
+    miles = miles_from(lat, lng)
+    return db.session.query(*LOCATED_COLUMNS + (miles,)) \
+      .filter(in_box(*bounding_box(lat, lng, radius)), miles <= radius) \
+      .order_by(miles, Venue.id) \
+      .limit(limit) \
+      .all()
+  matches = venue_grid().nearby(lat, lng, radius, limit)
+  rows = {row.id: row for row in db.session.query(*LOCATED_COLUMNS)
+          .filter(Venue.id.in_([id for miles, id in matches]))}
+  return [tuple(rows[id]) + (miles,) for miles, id in matches if id in rows]
+
+def venues_in_box(south, west, north, east, after, limit):
+  # one keyset page of the venues inside the box ordered by id, and the next cursor
+  if db.engine.dialect.name == 'postgresql':
+    rows = db.session.query(*LOCATED_COLUMNS) \
+      .filter(in_box(south, west, north, east), Venue.id > after) \
+      .order_by(Venue.id) \
+      .limit(limit + 1) \
+      .all()
+  elif venue_grid().count(south, west, north, east) * 4 > len(venue_grid()):
+    # a quarter of the venues or more are in the box: walking the primary key
+    # fills a page within a few pages' worth of rows
+    rows = db.session.query(*LOCATED_COLUMNS) \
+      .filter(Venue.latitude.between(south, north), Venue.longitude.between(west, east), Venue.id > after) \
+      .order_by(Venue.id) \
+      .limit(limit + 1) \
+      .all()
+  else:
+    ids = heapq.nsmallest(limit + 1, (id for id in venue_grid().within_box(south, west, north, east) if id > after))
+    rows = db.session.query(*LOCATED_COLUMNS).filter(Venue.id.in_(ids)).order_by(Venue.id).all()
+  return rows[:limit], (rows[limit - 1].id if len(rows) > limit else None)
+
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+def parse_show_record(record):
+  # applies the ShowForm rules to one imported record: artist_id, venue_id and
+  # start_time are required, and start_time uses the form's datetime format.
+  # duration is optional, in minutes.
+  if isinstance(record, bulk.MalformedRecord):
+    return {}, [record.error]
+  row = {}
+  errors = []
+  for field in ('artist_id', 'venue_id'):
+    value = str(record.get(field) or '').strip()
+    if not value:
+      errors.append('{} is required'.format(field))
+    elif not value.isdigit():
+      errors.append('{} must be an integer'.format(field))
+    else:
+      row[field] = int(value)
+  value = str(record.get('start_time') or '').strip()
+  if not value:
+    errors.append('start_time is required')
+  else:
+    try:
+      row['start_time'] = convert_string_datetime(value)
+    except ValueError:
+      errors.append('start_time must look like YYYY-MM-DD HH:MM:SS')
+  try:
+    row['duration'] = parse_duration(record.get('duration'))
+  except ValueError as e:
+    errors.append(str(e))
+  if not errors:
+    row['end_time'] = show_end(row['start_time'], row['duration'])
+  return row, errors
+
+def insert_rows(connection, table, rows):
+  # COPY on PostgreSQL/psycopg2, executemany everywhere else
+  if connection.dialect.name != 'postgresql' or \
+      not bulk.copy_rows(connection, table.name, list(rows[0]), rows):
+    connection.execute(table.insert(), rows)
+
+# ids looked up per IN (...) list, well under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+def existing_ids(model, ids):
+  found = set()
+  for chunk in bulk.batched(sorted(ids), ID_CHUNK_SIZE):
+    found.update(id for id, in db.session.query(model.id).filter(model.id.in_(chunk)))
+  return found
+
+def import_shows(records):
+  # validates every record, checks the referenced ids, rejects double
+  # bookings, then inserts the valid rows in batches and commits them as a
+  # single transaction. Returns the number of inserted shows and the errors
+  # of the rejected rows, by row number.
+  rows = []
+  errors = []
+  for number, record in enumerate(records, 1):
+    row, row_errors = parse_show_record(record)
+    if row_errors:
+      errors.append(dict(row=number, errors=row_errors))
+    else:
+      rows.append((number, row))
+
+  found_artists = existing_ids(Artist, {row['artist_id'] for number, row in rows})
+  found_venues = existing_ids(Venue, {row['venue_id'] for number, row in rows})
+  valid = []
+  for number, row in rows:
+    row_errors = []
+    if row['artist_id'] not in found_artists:
+      row_errors.append('artist {} does not exist'.format(row['artist_id']))
+    if row['venue_id'] not in found_venues:
+      row_errors.append('venue {} does not exist'.format(row['venue_id']))
+    if row_errors:
+      errors.append(dict(row=number, errors=row_errors))
+    else:
+      valid.append((number, row))
+
+  # a row may neither overlap a stored show nor an earlier row of the import
+  stored = show_conflicts(valid)
+  imported = IntervalIndex()
+  accepted = []
+  for number, row in valid:
+    keys = booking_keys(row['venue_id'], row['artist_id'])
+    row_errors = stored.get(number, []) + [
+      describe_conflict(kind, id, 'row {}'.format(other), start_time, end_time)
+      for (kind, id), other, start_time, end_time in imported.conflicts(keys, row['start_time'], row['end_time'])]
+    if row_errors:
+      errors.append(dict(row=number, errors=row_errors))
+    else:
+      imported.add(number, keys, row['start_time'], row['end_time'])
+      accepted.append(row)
+  valid = accepted
+  errors.sort(key=lambda error: error['row'])
+
+  # core inserts skip the mapper events, so the counters and cache are updated here
+  connection = db.session.connection()
+  last_id = None
+  if Show in booking_indexes:
+    last_id = db.session.query(func.max(Show.id)).scalar() or 0
+  for batch in bulk.batched(valid, app.config['IMPORT_BATCH_SIZE']):
+    insert_rows(connection, Show.__table__, batch)
+  if last_id is not None:
+    # the new shows reach the booking index with the commit below
+    pending_on_commit(db.session, 'show_bookings').extend(
+      (id, booking_keys(venue_id, artist_id), start_time, end_time)
+      for id, venue_id, artist_id, start_time, end_time in db.session.query(
+        Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+      .filter(Show.id > last_id))
+  venue_ids = {row['venue_id'] for row in valid}
+  artist_ids = {row['artist_id'] for row in valid}
+  update_upcoming_counts({Venue: venue_ids, Artist: artist_ids})
+  db.session.commit()
+  detail_cache.delete(*['venue:{}'.format(id) for id in venue_ids] +
+                      ['artist:{}'.format(id) for id in artist_ids])
+  return len(valid), errors
+
+
+# venues and artists are matched on this natural key when imported
+NATURAL_KEY = ('name', 'city', 'state')
+
+# columns the app maintains itself, ignored in imported records
+DERIVED_COLUMNS = ('upcoming_shows_count', 'updated_at', 'latitude', 'longitude')
+
+def parse_entity_record(model, record):
+  # one imported venue/artist record as column values plus genre names.
+  # Columns the form requires are required here too.
+  if isinstance(record, bulk.MalformedRecord):
+    return {}, [], [record.error]
+  row = {}
+  errors = []
+  for column in model.__table__.columns:
+    if column.primary_key or column.name in DERIVED_COLUMNS:
+      continue
+    value = record.get(column.name)
+    if isinstance(column.type, db.Boolean):
+      row[column.name] = str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+    elif value is None or str(value).strip() == '':
+      errors.append('{} is required'.format(column.name))
+    else:
+      row[column.name] = str(value).strip()
+  genres = record.get('genres') or []
+  if isinstance(genres, str):
+    genres = genres.split(',')
+  genres = [str(genre).strip() for genre in genres if str(genre).strip()]
+  return row, genres, errors
+
+def genre_ids(names):
+  # ids of the named genres, inserting the missing ones
+  names = set(names)
+  ids = dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+  missing = [dict(name=name) for name in names if name not in ids]
+  if missing:
+    db.session.execute(Genre.__table__.insert(), missing)
+    ids.update(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+  return ids
+
+def upsert_entities(model, rows):
+  # inserts or updates rows by NATURAL_KEY and returns {natural key: id}
+  table = model.__table__
+  if db.engine.dialect.name == 'postgresql':
+    statement = postgresql.insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+      index_elements=list(NATURAL_KEY),
+      set_=dict({name: statement.excluded[name] for name in rows[0] if name not in NATURAL_KEY},
+                updated_at=func.now()))
+    result = db.session.execute(statement.returning(table.c.id, table.c.name, table.c.city, table.c.state))
+    return {tuple(key): id for id, *key in result}
+
+  # elsewhere: look the keys up, update the matches and insert the rest. The
+  # lookup goes by name; same-named entities elsewhere are left out.
+  keys = {tuple(row[name] for name in NATURAL_KEY) for row in rows}
+  def existing():
+    matches = db.session.query(model.id, model.name, model.city, model.state) \
+      .filter(model.name.in_({row['name'] for row in rows}))
+    return {(name, city, state): id for id, name, city, state in matches if (name, city, state) in keys}
+  ids = existing()
+  updates = [dict(row, _id=ids[key]) for key, row in
+             ((tuple(row[name] for name in NATURAL_KEY), row) for row in rows) if key in ids]
+  inserts = [row for row in rows if tuple(row[name] for name in NATURAL_KEY) not in ids]
+  if updates:
+    db.session.execute(table.update().where(table.c.id == bindparam('_id')), updates)
+  if inserts:
+    db.session.execute(table.insert(), inserts)
+    ids = existing()
+  return ids
+
+def import_entities(model, records, batch_size, progress=None):
+  # streams venue or artist records, upserting them by (name, city, state) and
+  # committing every batch_size records. Returns the number of upserted records
+  # and the errors of the rejected ones, by row number.
+  association = venue_genres if model is Venue else artist_genres
+  key_column = association.c.venue_id if model is Venue else association.c.artist_id
+  upserted = 0
+  errors = []
+  numbered = enumerate(records, 1)
+  for batch in bulk.batched(numbered, batch_size):
+    rows = {}
+    for number, record in batch:
+      row, genres, row_errors = parse_entity_record(model, record)
+      if row_errors:
+        errors.append(dict(row=number, errors=row_errors))
+      else:
+        if model is Venue:
+          row['latitude'], row['longitude'] = geocoder.locate(row['city'], row['state']) or (None, None)
+        # the last record wins when a key repeats within a batch
+        rows[tuple(row[name] for name in NATURAL_KEY)] = (row, genres)
+    if rows:
+      ids = upsert_entities(model, [row for row, genres in rows.values()])
+      genre_id = genre_ids(name for row, genres in rows.values() for name in genres)
+      batch_ids = [ids[key] for key in rows]
+      db.session.execute(association.delete().where(key_column.in_(batch_ids)))
+      links = [{key_column.name: ids[key], 'genre_id': genre_id[name]}
+               for key, (row, genres) in rows.items() for name in set(genres)]
+      if links:
+        db.session.execute(association.insert(), links)
+      # their own pages and, as for an edit, the pages of their counterparts
+      prefix = 'venue:' if model is Venue else 'artist:'
+      stale = counterpart_cache_keys(db.session, model, batch_ids)
+      stale.update(prefix + str(id) for id in batch_ids)
+      db.session.commit()
+      detail_cache.delete(*stale)
+      upserted += len(rows)
+    if progress is not None:
+      progress(batch[-1][0], upserted, len(errors))
+
+  # core statements bypass the mapper events: rebuild what they would maintain
+  name_indexes.pop(model, None)
+  prefix_indexes.pop(model, None)
+  geo_indexes.pop(model, None)
+  rebuild_facet_counts()
+  return upserted, errors
+
+def seed_database(venues, artists, shows, seed=0, progress=None):
+  # fills an empty database with synthetic venues, artists and shows from
+  # datagen, committing every IMPORT_BATCH_SIZE rows, then rebuilds what the
+  # mapper events would have maintained
+  if db.session.query(Venue.id).first() or db.session.query(Artist.id).first():
+    raise ValueError('seed_database needs an empty database')
+  generator = datagen.Generator(seed)
+  batch_size = app.config['IMPORT_BATCH_SIZE']
+  genre_id = genre_ids(name for name, weight in datagen.GENRES)
+  for model, association, key, rows in (
+      (Venue, venue_genres, 'venue_id', generator.venues(venues)),
+      (Artist, artist_genres, 'artist_id', generator.artists(artists)),
+      (Show, None, None, generator.shows(shows, range(1, venues + 1), range(1, artists + 1)))):
+    inserted = 0
+    for batch in bulk.batched(rows, batch_size):
+      connection = db.session.connection()
+      if association is None:
+        insert_rows(connection, model.__table__, batch)
+      else:
+        insert_rows(connection, model.__table__, [row for row, genres in batch])
+        insert_rows(connection, association, [{key: row['id'], 'genre_id': genre_id[name]}
+                                              for row, genres in batch for name in genres])
+      db.session.commit()
+      inserted += len(batch)
+      if progress is not None:
+        progress(model.__tablename__, inserted)
+    if association is not None and db.engine.dialect.name == 'postgresql':
+      # the ids were assigned here, so move the sequence past them
+      db.session.execute(select([func.setval(func.pg_get_serial_sequence('"{}"'.format(model.__tablename__), 'id'),
+                                             select([func.max(model.id)]).as_scalar())]))
+
+  refresh_upcoming_counts()
+  geocode_venues()
+  name_indexes.clear()
+  prefix_indexes.clear()
+  booking_indexes.clear()
+  rebuild_facet_counts()
+  detail_cache.clear()
+
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+EXPORT_CHUNK_SIZE = 1000
+
+def export_columns(kind):
+  if kind == 'shows':
+    return ['id', 'start_time', 'duration', 'end_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name']
+  model = FACET_ENTITIES[kind]
+  return [column.name for column in model.__table__.columns
+          if column.name != 'upcoming_shows_count'] + ['genres']
+
+def export_rows(kind, since=None):
+  # streams rows as dicts through a server-side cursor (yield_per), so memory
+  # stays constant whatever the table size. since filters shows on start_time.
+  if kind == 'shows':
+    query = db.session.query(Show.id, Show.start_time, Show.duration, Show.end_time,
+                             Show.venue_id, Venue.name.label('venue_name'),
+                             Show.artist_id, Artist.name.label('artist_name')) \
+      .join(Venue, Venue.id == Show.venue_id) \
+      .join(Artist, Artist.id == Show.artist_id) \
+      .order_by(Show.id)
+    if since is not None:
+      query = query.filter(Show.start_time >= since)
+    for row in query.yield_per(EXPORT_CHUNK_SIZE):
+      yield row._asdict()
+    return
+
+  model = FACET_ENTITIES[kind]
+  columns = [column for column in model.__table__.columns if column.name != 'upcoming_shows_count']
+  query = db.session.query(*columns).order_by(model.id).yield_per(EXPORT_CHUNK_SIZE)
+  for chunk in bulk.batched(query, EXPORT_CHUNK_SIZE):
+    # the genres of a whole chunk come from one query
+    genres = {}
+    for id, name in db.session.query(model.id, Genre.name).join(model.genres) \
+        .filter(model.id.in_([row.id for row in chunk])).order_by(Genre.name):
+      genres.setdefault(id, []).append(name)
+    for row in chunk:
+      yield dict(row._asdict(), genres=genres.get(row.id, []))
+
+def export_lines(kind, format, since=None):
+  write, mimetype = bulk.WRITERS[format]
+  return write(export_columns(kind), export_rows(kind, since))
+
+
+#----------------------------------------------------------------------------#
+# API.
+#----------------------------------------------------------------------------#
+
+def json_dumps(value):
+  # orjson when installed; both write datetimes as ISO 8601
+  if orjson is not None:
+    return orjson.dumps(value)
+  return json.dumps(value, separators=(',', ':'),
+                    default=lambda value: value.isoformat()).encode('utf-8')
+
+def select_fields(item, fields):
+  return {name: value for name, value in item.items() if name in fields}
+
+def api_response(data, **meta):
+  # ?fields=a,b keeps only those keys of each item; large bodies are gzipped
+  # for clients that accept it
+  if request.args.get('fields'):
+    fields = set(request.args['fields'].split(','))
+    data = [select_fields(item, fields) for item in data] if isinstance(data, list) else select_fields(data, fields)
+  body = json_dumps(dict(meta, data=data))
+  response = Response(body, mimetype='application/json')
+  response.vary.add('Accept-Encoding')
+  if 'gzip' in request.accept_encodings and len(body) >= app.config['API_GZIP_MIN_SIZE']:
+    response.set_data(gzip.compress(body, 6))
+    response.headers['Content-Encoding'] = 'gzip'
+  return response
+
+def api_page_size():
+  try:
+    limit = int(request.args.get('limit', app.config['API_PAGE_SIZE']))
+  except ValueError:
+    abort(400)
+  return max(1, min(limit, app.config['API_PAGE_SIZE']))
+
+def list_entities(model, after, limit, criteria=()):
+  # one keyset page of venues or artists ordered by id, and the next cursor
+  rows = db.session.query(model.id, model.name, model.city, model.state, model.upcoming_shows_count) \
+    .filter(model.id > after, *criteria) \
+    .order_by(model.id) \
+    .limit(limit + 1) \
+    .all()
+  data = [dict(id=id, name=name, city=city, state=state, num_upcoming_shows=num_upcoming_shows)
+          for id, name, city, state, num_upcoming_shows in rows[:limit]]
+  return data, (data[-1]['id'] if len(rows) > limit else None)
+
+
+def require_api_token():
+  # the bulk endpoints take "Authorization: Bearer <IMPORT_API_TOKEN>" and are
+  # disabled while no token is configured
+  token = app.config.get('IMPORT_API_TOKEN')
+  scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+  if not token or scheme != 'Bearer' or not hmac.compare_digest(supplied.encode(), token.encode()):
+    abort(403)
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -149,83 +1724,56 @@ def index():
   return render_template('pages/home.html')
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+@app.route('/autocomplete')
+@read_only
+def autocomplete():
+  # as-you-type suggestions for the search boxes, served from memory
+  prefix = request.args.get('q', '')
+  limit = app.config['AUTOCOMPLETE_LIMIT']
+  kinds = {'venues': Venue, 'artists': Artist}
+  if request.args.get('type') in kinds:
+    kinds = {request.args['type']: kinds[request.args['type']]}
+  return jsonify({kind: [dict(id=id, name=name) for id, name in prefix_index(model).complete(prefix, limit)]
+                  for kind, model in kinds.items()})
+
+
 #  Venues
 #  ----------------------------------------------------------------
 @app.route('/venues')
+@read_only
+@conditional(venues_validators)
+@cached_page
 def venues():
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  uniquecitiesanstate = Venue.query.distinct(Venue.city, Venue.state).all()
-  data = [dict(city=unique.city, 
-                state=unique.state, 
-                venues=[dict(id=v.id, 
-                              name=v.name, 
-                              num_upcoming_shows=Show.query.filter(Show.start_time > datetime.datetime.now(),
-                                                                  Show.venue_id == v.id).count()
-                              ) for v in Venue.query.filter(Venue.city == unique.city, 
-                                          Venue.state == unique.state).all()]
-                                          ) for unique in uniquecitiesanstate]
+  data = load_venue_areas(facet_filters(Venue, request.args))
   
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=data, facets=facet_links('venues', request.args))
 
 
 #  Search Venue
 #  ----------------------------------------------------------------
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form['search_term']
-  qry = Venue.query.filter(Venue.name.like('%' + search_term + '%'))
-  count = qry.count()
-  venues = qry.all()
-  list_venues = [dict(id=venue.id, 
-                      name=venue.name, 
-                      num_upcoming_shows= Show.query.filter(Show.venue_id ==venue.id).count() ) 
-                      for venue in venues]
-  response={
-    "count": count,
-    "data": list_venues
-    
-  }
+  response = search_by_name(Venue, request.form['search_term'])
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 #  Venue with ID
 #  ----------------------------------------------------------------
 @app.route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_validators)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  venue_object = Venue.query.get(venue_id)
-  past_shows =  [show.display_show_venue for show in  Show.query.filter(datetime.datetime.now() > Show.start_time,
-                                                                        Show.venue_id == venue_object.id)]
-  upcoming_shows = [show.display_show_venue for show in  Show.query.filter(Show.start_time > datetime.datetime.now(),
-                                                                           Show.venue_id == venue_object.id)]
-  past_shows_count = Show.query.filter(datetime.datetime.now() > Show.start_time,
-                                      Show.venue_id == venue_object.id).count()
-  upcoming_shows_count = Show.query.filter(Show.start_time > datetime.datetime.now(),
-                                          Show.venue_id == venue_object.id).count()
-
-  data={
-    "id": venue_object.id,
-    "name": venue_object.name,
-    "genres": venue_object.genres.split(", "),
-    "address": venue_object.address,
-    "city": venue_object.city,
-    "state": venue_object.state,
-    "phone": venue_object.phone,
-    "website": venue_object.website,
-    "facebook_link": venue_object.facebook_link,
-    "seeking_talent": venue_object.seeking_talent,
-    "seeking_description": venue_object.seeking_description,
-    "image_link": venue_object.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": past_shows_count,
-    "upcoming_shows_count": upcoming_shows_count,
-  }
+  data = with_split_shows(venue_detail(venue_id))
 
   return render_template('pages/show_venue.html', venue=data)
 
@@ -243,24 +1791,25 @@ def create_venue_submission():
   error = False
   try:
     form_venue = request.form 
-    genre_string = ', '.join([str(genre) for genre in form_venue.getlist('genres')])
     new_venue = Venue(name=form_venue['name'],
     city=form_venue['city'],
     state=form_venue['state'],
     address=form_venue['address'],
     phone=form_venue['phone'],
-    genres=genre_string,
+    genres=get_genres(form_venue.getlist('genres')),
     facebook_link=form_venue['facebook_link'],
     image_link=form_venue['image_link'],
     website=form_venue['website'],
     seeking_talent=bool(form_venue['seeking_talent']),
     seeking_description=form_venue['seeking_description'])
+    locate_venue(new_venue)
     db.session.add(new_venue)
+    update_facet_counts('venues', set(), facets_of(new_venue))
     db.session.commit()
   except:
     error = True
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not create venue')
   finally:
     db.session.close()
   # TODO: modify data to be the data object returned from db insertion
@@ -279,21 +1828,8 @@ def create_venue_submission():
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
-  venue_object = Venue.query.get(venue_id)
-  venue={
-    "id": venue_object.id,
-    "name": venue_object.name,
-    "genres": venue_object.genres.split(", "),
-    "address": venue_object.address,
-    "city": venue_object.city,
-    "state": venue_object.state,
-    "phone": venue_object.phone,
-    "website": venue_object.website,
-    "facebook_link": venue_object.facebook_link,
-    "seeking_talent": venue_object.seeking_talent,
-    "seeking_description": venue_object.seeking_description,
-    "image_link": venue_object.image_link
-  }
+  venue = dict(venue_detail(venue_id))
+  del venue['shows']
   # TODO: populate form with values from venue with ID <venue_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
@@ -307,23 +1843,26 @@ def edit_venue_submission(venue_id):
   error = False
   try:
     form_venue = request.form 
-    genre_string = ', '.join([str(genre) for genre in form_venue.getlist('genres')])
     venue = Venue.query.get(venue_id)
+    facets = facets_of(venue)
     venue.name = form_venue['name']
     venue.city = form_venue['city']
     venue.state = form_venue['state']
     venue.address = form_venue['address']
     venue.phone = form_venue['phone']
-    venue.genres = genre_string
+    venue.genres = get_genres(form_venue.getlist('genres'))
+    venue.updated_at = datetime.datetime.utcnow()
     venue.facebook_link = form_venue['facebook_link']
     venue.image_link = form_venue['image_link']
     venue.website = form_venue['website']
     venue.seeking_talent = bool(form_venue['seeking_talent'])
     venue.seeking_description = form_venue['seeking_description']
+    locate_venue(venue)
+    update_facet_counts('venues', facets, facets_of(venue))
     db.session.commit()
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not edit venue %s', venue_id)
     error = True 
   finally:
     db.session.close()
@@ -345,11 +1884,12 @@ def delete_venue(venue_id):
   error = False
   try:
     venue = Venue.query.get(venue_id)
+    update_facet_counts('venues', facets_of(venue), set())
     db.session.delete(venue)
     db.session.commit() 
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not delete venue %s', venue_id)
     error = True
   finally:
     db.session.close()
@@ -366,73 +1906,41 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
+@conditional(artists_validators)
+@cached_page
 def artists():
   # TODO: replace with real data returned from querying the database
-  data_tuples = db.session.query(Artist.id, Artist.name).all()
+  data_tuples = db.session.query(Artist.id, Artist.name).filter(*facet_filters(Artist, request.args)).all()
   data = []
   for id, name in data_tuples:
     data.append(dict(id=id, name=name))
 
   
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, facets=facet_links('artists', request.args))
 
 
 #  Search Artist
 #  ----------------------------------------------------------------
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  search_term = request.form['search_term']
-  qry = Artist.query.filter(Artist.name.like('%' + search_term + '%'))
-  count = qry.count()
-  artists = qry.all()
-  list_artists = [dict(id=artist.id, name=artist.name, num_upcoming_shows= Show.query.filter(Show.artist_id ==artist.id).count() ) for artist in artists]
-  print(artists)
-  print(count)
-  print(list_artists)
-  
-  response={
-    "count": count,
-    "data": list_artists
-  }
+  response = search_by_name(Artist, request.form['search_term'])
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 #  Artist with ID
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_validators)
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  artist_object = Artist.query.get(artist_id)
-  past_shows =  [show.display_show_artist for show in  Show.query.filter(datetime.datetime.now() > Show.start_time,
-                                                                        Show.artist_id == artist_object.id)]
-  upcoming_shows = [show.display_show_artist for show in  Show.query.filter(Show.start_time > datetime.datetime.now() ,
-                                                                        Show.artist_id == artist_object.id)]
-  past_shows_count = Show.query.filter(datetime.datetime.now() > Show.start_time,
-                                      Show.artist_id == artist_object.id).count()
-  upcoming_shows_count = Show.query.filter(Show.start_time > datetime.datetime.now(),
-                                          Show.artist_id == artist_object.id).count()
-
-  data={
-    "id": artist_object.id,
-    "name": artist_object.name,
-    "genres": artist_object.genres.split(", "),
-    "city": artist_object.city,
-    "state": artist_object.state,
-    "phone": artist_object.phone,
-    "website": artist_object.website,
-    "facebook_link": artist_object.facebook_link,
-    "seeking_venue": artist_object.seeking_venue,
-    "seeking_description": artist_object.seeking_description,
-    "image_link": artist_object.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": past_shows_count,
-    "upcoming_shows_count": upcoming_shows_count,
-  }
+  data = with_split_shows(artist_detail(artist_id))
   
   return render_template('pages/show_artist.html', artist=data)
 
@@ -441,20 +1949,8 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
-  artist_object = Artist.query.get(artist_id)
-  artist={
-    "id": artist_object.id,
-    "name": artist_object.name,
-    "genres": artist_object.genres.split(", "),
-    "city": artist_object.city,
-    "state": artist_object.state,
-    "phone": artist_object.phone,
-    "website": artist_object.website,
-    "facebook_link": artist_object.facebook_link,
-    "seeking_venue": artist_object.seeking_venue,
-    "seeking_description": artist_object.seeking_description,
-    "image_link": artist_object.image_link
-  }
+  artist = dict(artist_detail(artist_id))
+  del artist['shows']
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
@@ -465,22 +1961,24 @@ def edit_artist_submission(artist_id):
   error = False
   try:
     form_artist = request.form 
-    genre_string = ', '.join([str(genre) for genre in form_artist.getlist('genres')])
     artist = Artist.query.get(artist_id)
+    facets = facets_of(artist)
     artist.name = form_artist['name']
     artist.city = form_artist['city']
     artist.state = form_artist['state']
     artist.phone = form_artist['phone']
-    artist.genres = genre_string
+    artist.genres = get_genres(form_artist.getlist('genres'))
+    artist.updated_at = datetime.datetime.utcnow()
     artist.facebook_link = form_artist['facebook_link']
     artist.image_link = form_artist['image_link']
     artist.website = form_artist['website']
     artist.seeking_venue = bool(form_artist['seeking_venue'])
     artist.seeking_description = form_artist['seeking_description']
+    update_facet_counts('artists', facets, facets_of(artist))
     db.session.commit()
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not edit artist %s', artist_id)
     error = True 
   finally:
     db.session.close()
@@ -507,22 +2005,22 @@ def create_artist_submission():
   error = False
   try:
     form_artist = request.form 
-    genre_string = ', '.join([str(genre) for genre in form_artist.getlist('genres')])
     new_artist = Artist(name=form_artist['name'],
     city=form_artist['city'],
     state=form_artist['state'],
     phone=form_artist['phone'],
-    genres=genre_string,
+    genres=get_genres(form_artist.getlist('genres')),
     facebook_link=form_artist['facebook_link'],
     image_link=form_artist['image_link'],
     website=form_artist['website'],
     seeking_venue=bool(form_artist['seeking_venue']),
     seeking_description=form_artist['seeking_description'])
     db.session.add(new_artist)
+    update_facet_counts('artists', set(), facets_of(new_artist))
     db.session.commit()
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not create artist')
     error = True 
   finally:
     db.session.close()
@@ -542,14 +2040,19 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 @app.route('/shows')
+@read_only
+@conditional(shows_validators)
+@cached_page
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  shows = Show.query.order_by('id').all()
-  data = [show.display_show for show in shows]
-  print(datetime.datetime.now())
-  return render_template('pages/shows.html', shows=data)
+  upcoming = request.args.get('upcoming') == '1'
+  try:
+    page = load_show_page(request.args.get('after'), upcoming)
+  except ValueError:
+    abort(400)
+  return Response(stream_template('pages/shows.html', shows=page, upcoming=upcoming))
 
 
 #  Create Show
@@ -565,21 +2068,32 @@ def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
   error = False
+  conflicts = []
   try:
     form_show = request.form
-    new_show = Show(artist_id=form_show['artist_id'],
-    venue_id=form_show['venue_id'],
-    start_time=form_show['start_time'])
-    db.session.add(new_show)
-    db.session.commit()
+    new_show = Show(artist_id=int(form_show['artist_id']),
+    venue_id=int(form_show['venue_id']),
+    start_time=convert_string_datetime(form_show['start_time']),
+    duration=parse_duration(form_show.get('duration')))
+    # double bookings are refused up front; on PostgreSQL the exclusion
+    # constraints also catch a concurrent one at commit
+    conflicts = show_conflicts([(0, dict(venue_id=new_show.venue_id, artist_id=new_show.artist_id,
+                                         start_time=new_show.start_time,
+                                         end_time=show_end(new_show.start_time, new_show.duration)))]).get(0, [])
+    if not conflicts:
+      db.session.add(new_show)
+      db.session.commit()
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('could not create show')
     error = True 
   finally:
     db.session.close()
   if error:
     flash('An error occurred. Show could not be listed.')
+  elif conflicts:
+    for conflict in conflicts:
+      flash('Show could not be listed: {}.'.format(conflict))
   else:
     # on successful db insert, flash success
     flash('Show was successfully listed!')
@@ -588,6 +2102,242 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+#  Import Shows
+#  ----------------------------------------------------------------
+@app.route('/shows/import', methods=['POST'])
+def import_shows_submission():
+  # bulk import for booking partners: a CSV, JSON array or NDJSON body
+  require_api_token()
+  format = request.args.get('format') or bulk.MIMETYPES.get(request.mimetype, 'json')
+  stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+  try:
+    inserted, errors = import_shows(bulk.iter_records(stream, format))
+  except ValueError as error:
+    db.session.rollback()
+    return jsonify(inserted=0, errors=[], error='import failed, no shows imported: {}'.format(error)), 400
+  except IntegrityError as error:
+    # e.g. a show booked concurrently, refused at commit by the exclusion
+    # constraints; the shows are inserted in a single transaction
+    db.session.rollback()
+    return jsonify(inserted=0, errors=[], error='import failed, no shows imported: {}'.format(error.orig)), 409
+  except SQLAlchemyError:
+    db.session.rollback()
+    app.logger.exception('show import failed')
+    return jsonify(inserted=0, errors=[], error='import failed, no shows imported'), 500
+  return jsonify(inserted=inserted, errors=errors)
+
+#  API
+#  ----------------------------------------------------------------
+@app.route('/api/v1/venues')
+@read_only
+def api_venues():
+  data, next_cursor = list_entities(Venue, request.args.get('after', 0, type=int), api_page_size(),
+                             facet_filters(Venue, request.args))
+  return api_response(data, next=next_cursor)
+
+@app.route('/api/v1/venues/availability')
+@read_only
+def api_venue_availability():
+  # venues with a free slot of ?length= minutes (SHOW_DURATION by default) in
+  # the windows of availability_windows(), filtered like /api/v1/venues plus
+  # ?city=, e.g. ?city=Austin&state=TX&weekday=fri&days=7&length=180
+  try:
+    windows = availability_windows(request.args)
+    length = parse_duration(request.args.get('length'))
+  except ValueError:
+    abort(400)
+  criteria = facet_filters(Venue, request.args)
+  if request.args.get('city'):
+    criteria.append(Venue.city == request.args['city'])
+  venues, next_cursor = find_available_venues(windows, length, criteria,
+                                              request.args.get('after', 0, type=int), api_page_size())
+  data = [dict(id=id, name=name, city=city, state=state,
+               slots=[dict(start=start, end=end) for start, end in slots])
+          for id, name, city, state, slots in venues]
+  return api_response(data, next=next_cursor)
+
+@app.route('/api/v1/venues/nearby')
+@read_only
+def api_nearby_venues():
+  # ?lat=&lng= or ?city=&state= with ?radius= miles (NEARBY_RADIUS by
+  # default): the nearest venues first, each with its distance.
+  # ?bbox=south,west,north,east instead pages through the venues in the box.
+  try:
+    if request.args.get('bbox'):
+      south, west, north, east = [float(value) for value in request.args['bbox'].split(',')]
+      if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox out of range')
+      rows, next_cursor = venues_in_box(south, west, north, east, request.args.get('after', 0, type=int),
+                                        api_page_size())
+      return api_response([dict(zip(('id', 'name', 'city', 'state', 'latitude', 'longitude'), row))
+                           for row in rows], next=next_cursor)
+    if request.args.get('lat') or request.args.get('lng'):
+      lat, lng = float(request.args['lat']), float(request.args['lng'])
+      if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('point out of range')
+    else:
+      point = geocoder.locate(request.args.get('city'), request.args.get('state'))
+      if point is None:
+        raise ValueError('unknown place')
+      lat, lng = point
+    radius = float(request.args.get('radius', app.config['NEARBY_RADIUS']))
+    if not 0 < radius <= app.config['NEARBY_MAX_RADIUS']:
+      raise ValueError('radius out of range')
+  except (KeyError, ValueError):
+    abort(400)
+  rows = nearby_venues(lat, lng, radius, api_page_size())
+  return api_response([dict(zip(('id', 'name', 'city', 'state', 'latitude', 'longitude'), row),
+                            miles=round(row[-1], 1)) for row in rows], center=dict(latitude=lat, longitude=lng))
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@read_only
+def api_venue(venue_id):
+  return api_response(with_split_shows(venue_detail(venue_id)))
+
+@app.route('/api/v1/artists')
+@read_only
+def api_artists():
+  data, next_cursor = list_entities(Artist, request.args.get('after', 0, type=int), api_page_size(),
+                             facet_filters(Artist, request.args))
+  return api_response(data, next=next_cursor)
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@read_only
+def api_artist(artist_id):
+  return api_response(with_split_shows(artist_detail(artist_id)))
+
+@app.route('/api/v1/shows')
+@read_only
+def api_shows():
+  try:
+    page = load_show_page(request.args.get('after'), request.args.get('upcoming') == '1')
+  except ValueError:
+    abort(400)
+  data = list(page)
+  return api_response(data, next=page.next_cursor)
+
+#  Export
+#  ----------------------------------------------------------------
+@app.route('/export/<any(venues, artists, shows):kind>.<any(csv, ndjson):format>')
+def export(kind, format):
+  # streamed as it is read; ?since=YYYY-MM-DD[ HH:MM:SS] limits shows by start_time.
+  # A full table scan for partners only, like the import.
+  require_api_token()
+  since = None
+  if request.args.get('since'):
+    try:
+      since = dateutil.parser.parse(request.args['since'])
+    except (ValueError, OverflowError):
+      abort(400)
+  lines = export_lines(kind, format, since)
+  return Response(stream_with_context(lines), mimetype=bulk.WRITERS[format][1],
+                  headers={'Content-Disposition': 'attachment; filename={}.{}'.format(kind, format)})
+
+#  Monitoring
+#  ----------------------------------------------------------------
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(detail=detail_cache.stats(), pages=page_cache.stats(),
+                 fragments=app.jinja_env.fragment_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+  gauges = []
+  for cache, stats in (('detail', detail_cache.stats()), ('pages', page_cache.stats()),
+                       ('fragments', app.jinja_env.fragment_cache.stats())):
+    for key, value in stats.items():
+      gauges.append(('cache_' + key, 'Cache {} so far.'.format(key.replace('_', ' ')), dict(cache=cache), value))
+  return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+#  Commands
+#  ----------------------------------------------------------------
+@app.cli.command('rebuild-facets')
+def rebuild_facets_command():
+  """Recompute the cached genre/state/seeking facet counts."""
+  rebuild_facet_counts()
+  click.echo('Rebuilt {} facet counts.'.format(FacetCount.query.count()))
+
+@app.cli.command('refresh-upcoming-counts')
+def refresh_upcoming_counts_command():
+  """Age started shows out of the upcoming show counters. Run it periodically (e.g. from cron)."""
+  refresh_upcoming_counts()
+  click.echo('Refreshed upcoming show counts.')
+
+@app.cli.command('import-shows')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(bulk.FORMATS), help='Defaults to the file extension.')
+def import_shows_command(source, format):
+  """Bulk import shows from a CSV, JSON or NDJSON file ('-' for stdin)."""
+  try:
+    inserted, errors = import_shows(bulk.iter_records(source, format or bulk.guess_format(source.name)))
+  except (ValueError, SQLAlchemyError) as error:
+    # nothing was imported: the shows are inserted in a single transaction
+    db.session.rollback()
+    raise click.ClickException('import failed, no shows imported: {}'.format(error))
+  for error in errors:
+    click.echo('row {}: {}'.format(error['row'], '; '.join(error['errors'])), err=True)
+  click.echo('Imported {} shows, rejected {} rows.'.format(inserted, len(errors)))
+
+def import_entities_command(model, source, format, batch_size):
+  def progress(processed, upserted, rejected):
+    click.echo('{} records read, {} upserted, {} rejected'.format(processed, upserted, rejected))
+  upserted, errors = import_entities(model, bulk.iter_records(source, format or bulk.guess_format(source.name)),
+                                     batch_size, progress)
+  for error in errors:
+    click.echo('row {}: {}'.format(error['row'], '; '.join(error['errors'])), err=True)
+  click.echo('Upserted {} records, rejected {} rows.'.format(upserted, len(errors)))
+
+@app.cli.command('import-venues')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Records per commit.')
+def import_venues_command(source, format, batch_size):
+  """Upsert venues by (name, city, state) from a CSV or NDJSON file."""
+  import_entities_command(Venue, source, format, batch_size)
+
+@app.cli.command('import-artists')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Records per commit.')
+def import_artists_command(source, format, batch_size):
+  """Upsert artists by (name, city, state) from a CSV or NDJSON file."""
+  import_entities_command(Artist, source, format, batch_size)
+
+@app.cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=10000, show_default=True)
+@click.option('--shows', default=100000, show_default=True)
+@click.option('--seed', default=0, show_default=True, help='Same seed, same data.')
+def seed_command(venues, artists, shows, seed):
+  """Fill an empty database with synthetic data, e.g. --venues 100000 --artists 1000000 --shows 10000000."""
+  def progress(table, inserted):
+    click.echo('{} {} rows'.format(table, inserted))
+  try:
+    seed_database(venues, artists, shows, seed, progress)
+  except ValueError as error:
+    raise click.UsageError(str(error))
+  click.echo('Seeded {} venues, {} artists and {} shows.'.format(venues, artists, shows))
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Relocate venues that already have a location.')
+def geocode_venues_command(everything):
+  """Locate venues from the bundled city centroid table (no network)."""
+  located, missing = geocode_venues(everything)
+  for city, state, count in missing:
+    click.echo('not found: {}, {} ({} venues)'.format(city, state, count), err=True)
+  click.echo('Located {} venues, {} places not found.'.format(located, len(missing)))
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--since', type=click.DateTime(), help='Only shows starting at or after this time.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+def export_command(kind, format, since, output):
+  """Stream venues, artists or shows as CSV or NDJSON."""
+  for line in export_lines(kind, format, since):
+    output.write(line)
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
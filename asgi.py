@@ -0,0 +1,170 @@
+"""ASGI entry point: uvicorn asgi:application
+
+Requires the ASGI packages of requirements.txt (asgiref, uvicorn, and
+asyncpg or aiosqlite). Every request is handed to the Flask app through
+asgiref's WsgiToAsgi, unless ASYNC_DETAIL_PAGES is set: then GET
+/venues/<id> and /artists/<id> are served natively with async SQLAlchemy,
+so a slow query no longer holds a worker thread and a process can keep
+hundreds of them in flight, their independent queries running concurrently
+on separate connections. That pays off on PostgreSQL under high concurrency;
+on SQLite it is slower than the threaded WSGI app (bench.py --concurrency).
+
+The pages come out exactly as the WSGI app renders them: the same
+statements, detail_cache, templates, ETag validators, replica choice and
+before_request and after_request hooks, so they count in the request
+metrics like any other.
+"""
+import asyncio
+import re
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template, session, Response
+from flask.testing import EnvironBuilder
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import (app, detail_cache, Venue, Artist, POOL_OPTIONS, detail_statements, build_detail, cached_detail_entry,
+                 detail_validator_statements, detail_validator_parts, check_validators, set_validators,
+                 choose_replica, reading_own_writes, with_split_shows)
+
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'postgres': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+DETAIL_ROUTE = re.compile(r'^/(venues|artists)/(\d+)$')
+
+PAGES = {
+    'venues': (Venue, 'venue', 'pages/show_venue.html'),
+    'artists': (Artist, 'artist', 'pages/show_artist.html'),
+}
+
+engines = {}
+
+
+def engine(bind=None):
+    # the async twin of the primary (bind None) or of a replica bind, created
+    # on first use with the same pool settings as the sync engines
+    if bind not in engines:
+        url = make_url(app.config['SQLALCHEMY_BINDS'][bind] if bind else app.config['SQLALCHEMY_DATABASE_URI'])
+        url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+        options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        if url.get_backend_name() == 'sqlite':
+            options = {key: value for key, value in options.items() if key not in POOL_OPTIONS}
+        engines[bind] = create_async_engine(url, **options)
+    return engines[bind]
+
+
+async def fetch(stats, bind, statement, first=False):
+    # one statement on its own connection, so several can run at once. No
+    # request context is pushed while it runs, so it is recorded here.
+    started = time.perf_counter()
+    async with engine(bind).connect() as connection:
+        result = await connection.execute(statement)
+        rows = result.first() if first else result.fetchall()
+    stats.record_query(str(statement), time.perf_counter() - started)
+    return rows
+
+
+def request_environ(scope):
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    builder = EnvironBuilder(app, scope['path'], method=scope['method'], headers=headers,
+                             query_string=scope['query_string'])
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+async def detail_page(scope, send, collection, id):
+    # the Flask request context is only pushed between awaits: before Flask 2.2
+    # it lives in a thread local that concurrent requests on this loop share.
+    # Every push shares one environ, which carries the request stats.
+    model, kind, template = PAGES[collection]
+    environ = request_environ(scope)
+    with app.request_context(environ):
+        response = app.preprocess_request()
+        if response is not None:
+            response = app.process_response(app.make_response(response))
+        flashing = '_flashes' in session
+        bind = choose_replica()
+        own_writes = reading_own_writes()
+    if response is not None:
+        await respond(send, scope, response)
+        return True
+    stats = environ['fyyur.request_stats']
+
+    updated_at, shows = detail_validator_statements(model, id)
+    updated_at, shows = await asyncio.gather(fetch(stats, bind, updated_at, first=True),
+                                             fetch(stats, bind, shows, first=True))
+    if updated_at is None:
+        return not_found(stats)
+    validators = detail_validator_parts(updated_at[0], shows)
+
+    with app.request_context(environ):
+        etag, not_modified = check_validators(*validators)
+        # a pending flash message must reach the page, so never answer 304 then
+        not_modified = not_modified and not flashing
+        if not_modified:
+            response = app.process_response(set_validators(Response(status=304), etag, validators[1]))
+    if not_modified:
+        await respond(send, scope, response)
+        return True
+
+    key = '{}:{}'.format(kind, id)
+    data = None if own_writes else cached_detail_entry(key, etag)
+    if data is None:
+        entity, genres, shows = await asyncio.gather(
+            *[fetch(stats, bind, statement, first=index == 0) for index, statement in enumerate(detail_statements(model, id))])
+        if entity is None:
+            return not_found(stats)
+        data = build_detail(model, entity, genres, shows)
+        if not own_writes:
+            detail_cache.set(key, (etag, data))
+
+    with app.request_context(environ):
+        response = app.make_response(render_template(template, **{kind: with_split_shows(data)}))
+        if not flashing:
+            set_validators(response, etag, validators[1])
+        response = app.process_response(response)
+    await respond(send, scope, response)
+    return True
+
+
+def not_found(stats):
+    # a missing entity falls through to Flask, which serves and records the
+    # request again from the start
+    if stats.profiler is not None:
+        stats.profiler.disable()
+    return False
+
+
+async def respond(send, scope, response):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()],
+    })
+    try:
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.get_data()})
+    finally:
+        # records the request stats, as the WSGI server would
+        response.close()
+
+
+class Application(object):
+    """Routes the detail pages to detail_page() when ASYNC_DETAIL_PAGES is
+    set, and everything else to the WSGI app."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = WsgiToAsgi(wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if app.config['ASYNC_DETAIL_PAGES'] and scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            match = DETAIL_ROUTE.match(scope['path'])
+            # a missing entity falls through so Flask renders its usual 404
+            if match and await detail_page(scope, send, match.group(1), int(match.group(2))):
+                return
+        await self.wsgi(scope, receive, send)
+
+
+application = Application(app)
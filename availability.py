@@ -0,0 +1,100 @@
+import datetime
+from bisect import bisect_left, bisect_right
+
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+def daily_windows(first_day, days, start, end, weekdays=None):
+    """Yields a (start, end) datetime window on each of days days from first_day.
+
+    A window whose end is not after its start runs past midnight, so 18:00
+    to 02:00 is one evening. weekdays optionally keeps only those days,
+    0 being Monday.
+    """
+    length = datetime.datetime.combine(first_day, end) - datetime.datetime.combine(first_day, start)
+    if length <= datetime.timedelta(0):
+        length += datetime.timedelta(days=1)
+    for offset in range(days):
+        day = first_day + datetime.timedelta(days=offset)
+        if weekdays is None or day.weekday() in weekdays:
+            opens = datetime.datetime.combine(day, start)
+            yield opens, opens + length
+
+
+class Calendar(object):
+    """Show timelines of many venues, searched for free slots.
+
+    Each venue keeps parallel arrays of show starts and ends ordered by
+    start, plus the length of its longest show. A window is searched by
+    bisecting to the first show that could reach into it (none can start
+    before the window opens minus the longest show) and walking the gaps
+    between shows up to the window close, so a lookup costs one bisect plus
+    the shows inside the window, whatever the length of the calendar.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+        self._longest = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        # (venue_id, start, end) rows; ordered by venue and start they are
+        # appended without shifting anything
+        calendar = cls()
+        for venue_id, start, end in rows:
+            calendar.add(venue_id, start, end)
+        return calendar
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def add(self, venue_id, start, end):
+        starts = self._starts.get(venue_id)
+        if starts is None:
+            starts = self._starts[venue_id] = []
+            self._ends[venue_id] = []
+            self._longest[venue_id] = end - start
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        self._ends[venue_id].insert(i, end)
+        if end - start > self._longest[venue_id]:
+            self._longest[venue_id] = end - start
+
+    def free_slots(self, venue_id, start, end, length):
+        """Returns the (start, end) gaps of at least length within [start, end)."""
+        return self._search(venue_id, [(start, end)], length)
+
+    def available(self, venue_ids, windows, length):
+        """Returns {venue_id: slots} for the venues free for length in any window."""
+        windows = sorted(windows)
+        found = {}
+        for venue_id in venue_ids:
+            slots = self._search(venue_id, windows, length)
+            if slots:
+                found[venue_id] = slots
+        return found
+
+    def _search(self, venue_id, windows, length):
+        # the batch loop: one call per venue, whatever the number of windows
+        starts = self._starts.get(venue_id)
+        if not starts:
+            return [(start, end) for start, end in windows if end - start >= length]
+        ends = self._ends[venue_id]
+        longest = self._longest[venue_id]
+        count = len(starts)
+        slots = []
+        for start, end in windows:
+            free_from = start
+            i = bisect_left(starts, start - longest)
+            while i < count and starts[i] < end:
+                if starts[i] - free_from >= length:
+                    slots.append((free_from, starts[i]))
+                # shows stored before the constraints may overlap each other
+                if ends[i] > free_from:
+                    free_from = ends[i]
+                i += 1
+            if end - free_from >= length:
+                slots.append((free_from, end))
+        return slots
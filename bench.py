@@ -0,0 +1,381 @@
+"""Latency and query-count benchmark of every route in app.py.
+
+    python bench.py
+    python bench.py --database-url postgresql://postgres@localhost:5432/fyyur_bench \\
+        --venues 100000 --artists 1000000 --shows 10000000
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json
+
+An empty database is first seeded with datagen (a fresh SQLite file by
+default). Each route is then requested --requests times through the Flask
+test client. The p50/p95/p99 latency is printed for each route, along with
+the SQL statements per request, streamed bodies included. Unless --cached
+is given, the detail, page and fragment caches are emptied before every
+request, so the numbers measure the database and rendering work.
+--compare exits with status 1 when a route's p95 grew by more than
+--tolerance or it runs more queries than in the saved baseline. The
+format_datetime and conflict_lookup lines time those hot helpers alone,
+availability times availability.Calendar searches over 10,000 venues
+with a year of shows each, and nearby times geo.GridIndex radius lookups
+over 100,000 venues.
+
+--concurrency N also measures the throughput of the venue and artist pages
+with N requests in flight: on the sync app, one thread per request as in a
+threaded WSGI worker, and on asgi.py with ASYNC_DETAIL_PAGES, one task
+per request on a single event loop.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import threading
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+import warnings
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app
+import availability
+import datagen
+import geo
+import intervals
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def form(kind, name, rng):
+    return datagen.form(kind, name, rng.sample(['Jazz', 'Folk', 'Blues', 'Pop', 'Punk'], 2),
+                        city='San Francisco', state='CA', seeking_description='Benchmarking.')
+
+
+def routes(venues, artists, rng):
+    # (name, method, build) where build() returns the url and request kwargs.
+    # Venues and artists created here are edited and finally deleted again.
+    created = {'venue': [], 'artist': []}
+    counter = iter(range(1, sys.maxsize))
+    venue = lambda: rng.randint(1, venues)
+    artist = lambda: rng.randint(1, artists)
+    word = lambda: rng.choice(['blue', 'the', 'room', 'kim', 'wolves', 'hall', 'x'])
+
+    def create(kind):
+        def build():
+            name = 'Bench {} {}'.format(kind, next(counter))
+            created[kind].append(name)
+            return '/{}s/create'.format(kind), dict(data=form(kind, name, rng))
+        return build
+
+    def edit(kind, model):
+        def build():
+            id = model.query.filter_by(name=created[kind][-1]).one().id
+            return '/{}s/{}/edit'.format(kind, id), dict(data=form(kind, created[kind][-1], rng))
+        return build
+
+    def delete():
+        id = app.Venue.query.filter_by(name=created['venue'].pop()).one().id
+        return '/venues/{}/delete'.format(id), {}
+
+    def create_show():
+        start = datetime.datetime.now() + datetime.timedelta(days=rng.randint(1, 3650), hours=rng.randint(0, 23))
+        return '/shows/create', dict(data=dict(artist_id=str(artist()), venue_id=str(venue()),
+                                               start_time=start.strftime('%Y-%m-%d %H:%M:%S')))
+
+    def import_shows():
+        start = datetime.datetime.now() + datetime.timedelta(days=rng.randint(3650, 7300))
+        body = [dict(artist_id=artist(), venue_id=venue(),
+                     start_time=(start + datetime.timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'))
+                for i in range(100)]
+        return '/shows/import', dict(json=body, headers={'Authorization': 'Bearer bench'})
+
+    since = (datetime.datetime.now() + datetime.timedelta(days=200)).strftime('%Y-%m-%dT%H:%M:%S')
+    get = lambda url: lambda: (url() if callable(url) else url, {})
+    return [
+        ('index', 'GET', get('/')),
+        ('autocomplete', 'GET', get(lambda: '/autocomplete?q=' + word())),
+        ('venues', 'GET', get('/venues')),
+        ('venues filtered', 'GET', get('/venues?genre=Jazz&state=NY&seeking=yes')),
+        ('venue', 'GET', get(lambda: '/venues/{}'.format(venue()))),
+        ('venue search', 'POST', lambda: ('/venues/search', dict(data=dict(search_term=word())))),
+        ('venue create form', 'GET', get('/venues/create')),
+        ('venue create', 'POST', create('venue')),
+        ('venue edit form', 'GET', get(lambda: '/venues/{}/edit'.format(venue()))),
+        ('venue edit', 'POST', edit('venue', app.Venue)),
+        ('artists', 'GET', get('/artists')),
+        ('artists filtered', 'GET', get('/artists?genre=Rock+n+Roll&state=CA')),
+        ('artist', 'GET', get(lambda: '/artists/{}'.format(artist()))),
+        ('artist search', 'POST', lambda: ('/artists/search', dict(data=dict(search_term=word())))),
+        ('artist create form', 'GET', get('/artists/create')),
+        ('artist create', 'POST', create('artist')),
+        ('artist edit form', 'GET', get(lambda: '/artists/{}/edit'.format(artist()))),
+        ('artist edit', 'POST', edit('artist', app.Artist)),
+        ('shows', 'GET', get('/shows')),
+        ('shows upcoming', 'GET', get('/shows?upcoming=1')),
+        ('show create form', 'GET', get('/shows/create')),
+        ('show create', 'POST', create_show),
+        ('show import x100', 'POST', import_shows),
+        ('api venues', 'GET', get('/api/v1/venues')),
+        ('api venue', 'GET', get(lambda: '/api/v1/venues/{}'.format(venue()))),
+        ('api artists', 'GET', get('/api/v1/artists')),
+        ('api artist', 'GET', get(lambda: '/api/v1/artists/{}'.format(artist()))),
+        ('api shows', 'GET', get('/api/v1/shows?upcoming=1')),
+        ('api nearby', 'GET', get(lambda: '/api/v1/venues/nearby?city={}&state={}&radius=20'.format(
+            *rng.choice(datagen.CITIES)[:2]))),
+        ('api availability', 'GET', get('/api/v1/venues/availability?state=TX&weekday=fri&days=30&length=180')),
+        ('export shows', 'GET', lambda: ('/export/shows.ndjson?since=' + since,
+                                         dict(headers={'Authorization': 'Bearer bench'}))),
+        ('cache stats', 'GET', get('/cache/stats')),
+        ('metrics', 'GET', get('/metrics')),
+        ('venue delete', 'POST', delete),
+    ]
+
+
+def clear_caches():
+    app.detail_cache.clear()
+    app.page_cache.clear()
+    app.app.jinja_env.fragment_cache.clear()
+
+
+statements = [0]
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(*args):
+    statements[0] += 1
+
+
+def run(client, build, method, requests, cached):
+    # counts statements here rather than reading Server-Timing, which is sent
+    # before a streamed body has run its queries
+    latencies = []
+    queries = []
+    for i in range(requests):
+        url, kwargs = build()
+        if not cached:
+            clear_caches()
+        with client.session_transaction() as session:
+            # a write's flash message would otherwise bypass the caches of the next page
+            session.pop('_flashes', None)
+        statements[0] = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        latencies.append(time.perf_counter() - started)
+        queries.append(statements[0])
+        if response.status_code >= 400:
+            raise SystemExit('{} {} returned {}'.format(method, url, response.status_code))
+    return dict(p50=percentile(latencies, 0.5) * 1000, p95=percentile(latencies, 0.95) * 1000,
+                p99=percentile(latencies, 0.99) * 1000, queries=sum(queries) / len(queries))
+
+
+def format_datetime_benchmark(number=10000):
+    # the per-show cost of the datetime filter used by every show listing
+    value = datetime.datetime(2026, 5, 21, 21, 30)
+    with app.app.test_request_context():
+        seconds = timeit.timeit(lambda: app.format_datetime(value, 'full'), number=number)
+    return seconds / number * 1e6
+
+
+def conflict_lookup_benchmark(bookings=50000, number=10000):
+    # the per-lookup cost of an overlap check against one venue calendar of
+    # bookings shows, the in-process path used where there is no PostgreSQL
+    index = intervals.IntervalIndex()
+    first = datetime.datetime(2020, 1, 1, 20)
+    for id in range(bookings):
+        start = first + datetime.timedelta(hours=6 * id)
+        index.add(id, [('venue', 1), ('artist', id % 100)], start, start + datetime.timedelta(hours=2))
+    rng = random.Random(0)
+    starts = [first + datetime.timedelta(minutes=rng.randrange(bookings * 360)) for i in range(number)]
+    keys = [('venue', 1), ('artist', 7)]
+    duration = datetime.timedelta(hours=2)
+    started = time.perf_counter()
+    for start in starts:
+        index.conflicts(keys, start, start + duration)
+    return (time.perf_counter() - started) / number * 1e6
+
+
+def availability_benchmark(venues=10000, days=365, booked=0.4, number=5):
+    # batch free-slot searches over venues calendars holding a year of shows:
+    # one Friday evening, then every Friday evening of the year, for 3 hours.
+    # Returns (shows, milliseconds per one-evening search, per year search).
+    rng = random.Random(0)
+    first_day = datetime.date(2026, 1, 1)
+    calendar = availability.Calendar()
+    for venue_id in range(1, venues + 1):
+        for day in range(days):
+            if rng.random() < booked:
+                start = datetime.datetime.combine(first_day + datetime.timedelta(days=day),
+                                                  datetime.time(rng.choice((19, 20, 21))))
+                calendar.add(venue_id, start, start + datetime.timedelta(minutes=rng.choice((90, 120, 180))))
+    length = datetime.timedelta(hours=3)
+    evening = datetime.time(18), datetime.time(0)
+    friday = first_day + datetime.timedelta(days=(4 - first_day.weekday()) % 7)
+    timings = []
+    for windows in (list(availability.daily_windows(friday, 1, *evening)),
+                    list(availability.daily_windows(first_day, days, *evening, weekdays={4}))):
+        started = time.perf_counter()
+        for i in range(number):
+            calendar.available(range(1, venues + 1), windows, length)
+        timings.append((time.perf_counter() - started) / number * 1000)
+    return len(calendar), timings[0], timings[1]
+
+
+def nearby_benchmark(venues=100000, number=1000, radius=20):
+    # 20-mile nearest-50 lookups on the grid index over venues spread around
+    # the datagen cities by population, each at its own point as if geocoded
+    # from street addresses (a harder case than shared city centroids)
+    rng = random.Random(0)
+    centers = [app.geocoder.locate(city, state) for city, state, weight in datagen.CITIES]
+    weights = [weight for city, state, weight in datagen.CITIES]
+    grid = geo.GridIndex()
+    for id, (lat, lng) in enumerate(rng.choices(centers, weights, k=venues)):
+        grid.add(id, lat + rng.gauss(0, 0.3), lng + rng.gauss(0, 0.3))
+    probes = [(lat + rng.gauss(0, 0.2), lng + rng.gauss(0, 0.2)) for lat, lng in rng.choices(centers, weights, k=number)]
+    started = time.perf_counter()
+    for lat, lng in probes:
+        grid.nearby(lat, lng, radius, 50)
+    return (time.perf_counter() - started) / number * 1000
+
+
+def detail_paths(venues, artists, count, rng):
+    return [rng.choice(['/venues/{}'.format(rng.randint(1, venues)), '/artists/{}'.format(rng.randint(1, artists))])
+            for i in range(count)]
+
+
+def sync_throughput(paths, concurrency, cached):
+    local = threading.local()
+
+    def get(path):
+        if not hasattr(local, 'client'):
+            local.client = app.app.test_client()
+        if not cached:
+            app.detail_cache.clear()
+        local.client.get(path).get_data()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(get, paths))
+    return len(paths) / (time.perf_counter() - started)
+
+
+def async_throughput(paths, concurrency, cached):
+    import asgi
+    app.app.config['ASYNC_DETAIL_PAGES'] = True
+
+    async def get(path, semaphore):
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                 'headers': [], 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+                 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+
+        async with semaphore:
+            if not cached:
+                app.detail_cache.clear()
+            await asgi.application(scope, receive, send)
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*[get(path, semaphore) for path in paths])
+        for engine in asgi.engines.values():
+            await engine.dispose()
+        asgi.engines.clear()
+
+    started = time.perf_counter()
+    asyncio.run(run_all())
+    return len(paths) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Defaults to a new SQLite file.')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+    parser.add_argument('--cached', action='store_true', help='Keep the caches warm between requests.')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON.')
+    parser.add_argument('--compare', metavar='FILE', help='Fail on a regression against saved results.')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Allowed p95 growth for --compare.')
+    parser.add_argument('--concurrency', type=int, default=0, help='Also compare sync and async throughput.')
+    parser.add_argument('--throughput-requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app.app.config.update(SQLALCHEMY_DATABASE_URI=url, IMPORT_API_TOKEN='bench', PROFILE_SAMPLE_RATE=0)
+    app.app.logger.disabled = True
+    warnings.simplefilter('ignore', DeprecationWarning)
+    rng = random.Random(args.seed)
+
+    with app.app.app_context():
+        app.db.create_all()
+        if app.Venue.query.first() is None:
+            started = time.perf_counter()
+            app.seed_database(args.venues, args.artists, args.shows, args.seed)
+            print('seeded {} venues, {} artists, {} shows in {:.1f}s'.format(
+                args.venues, args.artists, args.shows, time.perf_counter() - started))
+        venues = app.db.session.query(app.func.max(app.Venue.id)).scalar()
+        artists = app.db.session.query(app.func.max(app.Artist.id)).scalar()
+
+        client = app.app.test_client()
+        results = {}
+        print('{:<20} {:>9} {:>9} {:>9} {:>8}'.format('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+        for name, method, build in routes(venues, artists, rng):
+            results[name] = result = run(client, build, method, args.requests, args.cached)
+            print('{:<20} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {queries:>8.1f}'.format(name, **result))
+        results['format_datetime'] = dict(microseconds=format_datetime_benchmark())
+        print('format_datetime      {:.1f} us per call'.format(results['format_datetime']['microseconds']))
+        results['conflict_lookup'] = dict(microseconds=conflict_lookup_benchmark())
+        print('conflict_lookup      {:.1f} us per call'.format(results['conflict_lookup']['microseconds']))
+        results['nearby'] = dict(milliseconds=nearby_benchmark())
+        print('nearby               {:.2f} ms per 20-mile lookup, 100000 venues'.format(
+            results['nearby']['milliseconds']))
+        shows, evening, year = availability_benchmark()
+        results['availability'] = dict(evening_ms=evening, year_ms=year)
+        print('availability         {:.1f} ms for one Friday evening, {:.1f} ms for 52 of them, '
+              '10000 venues, {} shows'.format(evening, year, shows))
+
+    if args.concurrency:
+        paths = detail_paths(venues, artists, args.throughput_requests, rng)
+        with app.app.app_context():
+            results['throughput sync'] = dict(rps=sync_throughput(paths, args.concurrency, args.cached))
+        results['throughput async'] = dict(rps=async_throughput(paths, args.concurrency, args.cached))
+        for mode in ('sync', 'async'):
+            print('throughput {:<9} {:.0f} requests/s at concurrency {}'.format(
+                mode, results['throughput ' + mode]['rps'], args.concurrency))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None or 'p95' not in result:
+                continue
+            if result['p95'] > before['p95'] * args.tolerance:
+                regressions.append('{}: p95 {:.2f} ms, was {:.2f} ms'.format(name, result['p95'], before['p95']))
+            if result['queries'] > before['queries']:
+                regressions.append('{}: {:.1f} queries, was {:.1f}'.format(name, result['queries'], before['queries']))
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
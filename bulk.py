@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+from itertools import islice
+
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+MIMETYPES = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+
+
+class MalformedRecord(object):
+    """Stands in for a record that could not be parsed.
+
+    The import reports it as an error of its row and carries on with the
+    next one, instead of losing the report of every other row.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def guess_format(filename, default='csv'):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in FORMATS else default
+
+
+def iter_records(stream, format):
+    """Yields the records of a text stream as dicts.
+
+    csv and ndjson are parsed one line at a time, so memory stays bounded
+    whatever the size of the input; json expects a single array and is loaded
+    whole. A record that cannot be parsed, or is not an object, is yielded as
+    a MalformedRecord; a json body that is not an array raises ValueError.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                record = MalformedRecord('malformed CSV line: {}'.format(e))
+            yield record
+    elif format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = MalformedRecord('malformed JSON line: {}'.format(e))
+                yield _object(record)
+    elif format == 'json':
+        records = json.load(stream)
+        if not isinstance(records, list):
+            raise ValueError('expected a JSON array')
+        for record in records:
+            yield _object(record)
+    else:
+        raise ValueError('unknown format: {}'.format(format))
+
+
+def _object(record):
+    if isinstance(record, (dict, MalformedRecord)):
+        return record
+    return MalformedRecord('not a JSON object')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_lines(columns, rows):
+    """Yields CSV text one line at a time, header first; lists are ', '-joined."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(columns)
+    for row in rows:
+        yield line([', '.join(row[column]) if isinstance(row[column], list) else row[column]
+                    for column in columns])
+
+
+def ndjson_lines(columns, rows):
+    """Yields one JSON document per row; datetimes are written like CSV's."""
+    for row in rows:
+        yield json.dumps({column: row[column] for column in columns}, default=str) + '\n'
+
+
+WRITERS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def copy_rows(connection, table, columns, rows):
+    """Loads rows with PostgreSQL COPY when the driver supports it.
+
+    Returns False without touching the database if the DBAPI connection has
+    no copy_expert (anything but psycopg2), so the caller can fall back to
+    executemany.
+    """
+    dbapi_connection = connection.connection
+    cursor = dbapi_connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        cursor.close()
+        return False
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    try:
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV'.format(
+            table, ', '.join(columns)), buffer)
+    finally:
+        cursor.close()
+    return True
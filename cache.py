@@ -0,0 +1,216 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class LRUCache(object):
+    """In-process cache bounded to maxsize entries, each expiring after ttl seconds.
+
+    Least recently used entries are evicted first. Values are stored as-is, so
+    callers must not mutate what they get back.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.timer():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+
+class RedisCache(object):
+    """The LRUCache interface over a Redis-compatible client.
+
+    Any object with get/setex/delete/scan_iter (redis.Redis, or a local fake
+    in tests) works. Values are pickled; expiry and eviction are left to the
+    server. Hit and miss counters are kept per process.
+    """
+
+    def __init__(self, client, ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(data)
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self, batch_size=500):
+        # drops this cache's keys only, a batch at a time, without the
+        # blocking KEYS command; other data on the server is left alone
+        keys = []
+        for key in self.client.scan_iter(match=self.prefix + '*', count=batch_size):
+            keys.append(key)
+            if len(keys) == batch_size:
+                self.client.delete(*keys)
+                keys = []
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses)
+
+
+class PageCache(object):
+    """LRU cache bounded by the total size of its values, with stale-while-revalidate.
+
+    An entry is fresh for ttl seconds, then may be served stale for up to
+    stale_ttl more seconds. get() returns (value, refresh): refresh is True
+    on a miss, and for exactly one caller once an entry goes stale, so only
+    that caller re-renders it while everyone else keeps getting the stale copy.
+    """
+
+    def __init__(self, max_bytes, ttl, stale_ttl=0, timer=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timer = timer
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bytes = 0
+        # key -> [fresh until, stale until, size, value, refresh claimed]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            now = self.timer()
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None, True
+            self._entries.move_to_end(key)
+            if entry[0] > now:
+                self.hits += 1
+                return entry[3], False
+            self.stale_hits += 1
+            refresh = not entry[4]
+            entry[4] = True
+            return entry[3], refresh
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            now = self.timer()
+            self._entries[key] = [now + self.ttl, now + self.ttl + self.stale_ttl, size, value, False]
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return dict(hits=self.hits, stale_hits=self.stale_hits, misses=self.misses,
+                    size=len(self._entries), bytes=self.bytes)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache part, ... %}...{% endcache %} caches a rendered template block.
+
+    Blocks are stored in environment.fragment_cache (a PageCache; caching is
+    off while it is None) under the given parts, so the parts must cover
+    everything the block renders.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = 'fragment:{!r}'.format(parts)
+        value, refresh = cache.get(key)
+        if refresh:
+            value = caller()
+            cache.set(key, value, len(value))
+        return value
+
+
+def create_cache(config):
+    # Redis when CACHE_REDIS_URL is set (requires the redis package), else in-process
+    if config.get('CACHE_REDIS_URL'):
+        import redis
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), config['CACHE_TTL'])
+    return LRUCache(config['CACHE_SIZE'], config['CACHE_TTL'])
@@ -0,0 +1,230 @@
+import datetime
+import random
+from collections import Counter
+from itertools import accumulate
+
+
+# (city, state, relative weight); roughly metro population, so a few cities
+# hold most venues and artists the way real listings do
+CITIES = [
+    ('New York', 'NY', 190), ('Los Angeles', 'CA', 130), ('Chicago', 'IL', 95),
+    ('Dallas', 'TX', 75), ('Houston', 'TX', 70), ('Washington', 'DC', 62),
+    ('Miami', 'FL', 61), ('Philadelphia', 'PA', 61), ('Atlanta', 'GA', 60),
+    ('Phoenix', 'AZ', 49), ('Boston', 'MA', 49), ('San Francisco', 'CA', 47),
+    ('Detroit', 'MI', 43), ('Seattle', 'WA', 40), ('Minneapolis', 'MN', 37),
+    ('San Diego', 'CA', 33), ('Tampa', 'FL', 32), ('Denver', 'CO', 30),
+    ('Baltimore', 'MD', 28), ('St. Louis', 'MO', 28), ('Orlando', 'FL', 26),
+    ('Charlotte', 'NC', 26), ('San Antonio', 'TX', 26), ('Portland', 'OR', 25),
+    ('Sacramento', 'CA', 24), ('Pittsburgh', 'PA', 24), ('Austin', 'TX', 23),
+    ('Las Vegas', 'NV', 23), ('Cincinnati', 'OH', 22), ('Kansas City', 'MO', 22),
+    ('Columbus', 'OH', 21), ('Indianapolis', 'IN', 21), ('Cleveland', 'OH', 21),
+    ('Nashville', 'TN', 20), ('Salt Lake City', 'UT', 13), ('New Orleans', 'LA', 13),
+    ('Memphis', 'TN', 13), ('Louisville', 'KY', 13), ('Richmond', 'VA', 13),
+    ('Oklahoma City', 'OK', 14), ('Albuquerque', 'NM', 9), ('Omaha', 'NE', 10),
+    ('Boise', 'ID', 8), ('Anchorage', 'AK', 4), ('Honolulu', 'HI', 10),
+    ('Burlington', 'VT', 2), ('Portland', 'ME', 5), ('Providence', 'RI', 16),
+]
+
+# the genre choices of forms.py with a rough popularity
+GENRES = [
+    ('Rock n Roll', 18), ('Pop', 16), ('Hip-Hop', 14), ('Jazz', 10), ('Electronic', 10),
+    ('Alternative', 9), ('R&B', 8), ('Country', 8), ('Folk', 6), ('Blues', 6),
+    ('Soul', 5), ('Punk', 5), ('Heavy Metal', 5), ('Reggae', 4), ('Funk', 4),
+    ('Classical', 4), ('Instrumental', 3), ('Musical Theatre', 2), ('Other', 3),
+]
+
+ADJECTIVES = [
+    'Blue', 'Red', 'Golden', 'Silver', 'Electric', 'Velvet', 'Midnight', 'Crimson',
+    'Lucky', 'Rusty', 'Broken', 'Wild', 'Quiet', 'Loud', 'Neon', 'Hidden', 'Painted',
+    'Crooked', 'Little', 'Grand', 'Old', 'Iron', 'Copper', 'Emerald', 'Hollow',
+    'Smoky', 'Dusty', 'Lonesome', 'Royal', 'Paper', 'Glass', 'Stone', 'Secret',
+]
+NOUNS = [
+    'Room', 'Hall', 'Lounge', 'Tavern', 'Garden', 'Cellar', 'Theatre', 'Parlor',
+    'Ballroom', 'Saloon', 'Warehouse', 'Attic', 'Barn', 'Club', 'Den', 'Depot',
+    'Factory', 'Pavilion', 'Station', 'Mill', 'Stage', 'Social', 'Exchange',
+]
+BAND_NOUNS = [
+    'Wolves', 'Rivers', 'Satellites', 'Ghosts', 'Lanterns', 'Owls', 'Echoes',
+    'Horses', 'Strangers', 'Comets', 'Pilots', 'Saints', 'Shadows', 'Arrows',
+    'Foxes', 'Sparrows', 'Machines', 'Tides', 'Kings', 'Daughters', 'Vandals',
+]
+FIRST_NAMES = [
+    'Ava', 'Ben', 'Carmen', 'Dev', 'Elena', 'Femi', 'Grace', 'Hiro', 'Isla', 'Jamal',
+    'Kira', 'Luis', 'Maya', 'Nico', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq',
+    'Uma', 'Victor', 'Wen', 'Ximena', 'Yusuf', 'Zoe',
+]
+LAST_NAMES = [
+    'Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito',
+    'Jones', 'Kim', 'Lopez', 'Moreau', 'Nguyen', 'Okafor', 'Patel', 'Quist', 'Rossi',
+    'Silva', 'Turner', 'Usman', 'Vance', 'Walsh', 'Xu', 'Young', 'Zhang',
+]
+STREETS = ['Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Market', 'Mission',
+           'Broadway', 'Church', 'Union', 'Water', 'Mill', 'Spring', 'Lake']
+
+# show start hours and how often each is booked
+START_HOURS = [(18, 1), (19, 3), (20, 5), (21, 4), (22, 2), (23, 1)]
+
+# show lengths in minutes and how often each is booked
+DURATIONS = [(90, 2), (120, 5), (150, 2), (180, 1)]
+
+
+def form(kind, name, genres=('Jazz',), **fields):
+    """The fields the create and edit forms of a venue or artist post.
+
+    A valid submission in Austin, TX unless fields say otherwise; tests and
+    bench.py build their requests from it.
+    """
+    data = dict(name=name, city='Austin', state='TX', phone='512-555-0100', genres=list(genres),
+                image_link='https://picsum.photos/300', facebook_link='https://www.facebook.com/fyyur',
+                website='https://fyyur.example.com', seeking_description='')
+    if kind == 'venue':
+        data.update(address='1 Test St', seeking_talent='')
+    else:
+        data.update(seeking_venue='')
+    data.update(fields)
+    return data
+
+
+class Generator(object):
+    """Seeded, reproducible synthetic venues, artists and shows.
+
+    Rows are plain dicts of column values ready for a core insert, produced
+    lazily so millions of them never sit in memory at once. Show times are
+    laid out around now (midnight today by default); the same seed and now
+    always yield the same data.
+    """
+
+    def __init__(self, seed=0, now=None):
+        self.random = random.Random(seed)
+        self.now = now or datetime.datetime.combine(datetime.date.today(), datetime.time())
+        self._cities = [(city, state) for city, state, weight in CITIES]
+        self._city_weights = list(accumulate(weight for city, state, weight in CITIES))
+        self._genres = [genre for genre, weight in GENRES]
+        self._genre_weights = list(accumulate(weight for genre, weight in GENRES))
+        self._hours = [hour for hour, weight in START_HOURS]
+        self._hour_weights = list(accumulate(weight for hour, weight in START_HOURS))
+        self._durations = [minutes for minutes, weight in DURATIONS]
+        self._duration_weights = list(accumulate(weight for minutes, weight in DURATIONS))
+        self._names = Counter()
+
+    def venues(self, count, first_id=1):
+        # yields (row, genre names); names are unique per city
+        for id in range(first_id, first_id + count):
+            city, state = self._city()
+            name = self._unique('The {} {}'.format(self._pick(ADJECTIVES), self._pick(NOUNS)), city, state)
+            seeking = self.random.random() < 0.3
+            row = dict(id=id, name=name, city=city, state=state,
+                       address='{} {} St'.format(self.random.randint(1, 9999), self._pick(STREETS)),
+                       seeking_talent=seeking,
+                       seeking_description='Looking for local acts to play weekend nights.' if seeking else '',
+                       **self._contact('venue', id, name))
+            yield row, self._genres_of(1, 4)
+
+    def artists(self, count, first_id=1):
+        # yields (row, genre names); solo acts and bands, unique per city
+        for id in range(first_id, first_id + count):
+            city, state = self._city()
+            if self.random.random() < 0.4:
+                name = '{} {}'.format(self._pick(FIRST_NAMES), self._pick(LAST_NAMES))
+            else:
+                name = 'The {} {}'.format(self._pick(ADJECTIVES), self._pick(BAND_NOUNS))
+            name = self._unique(name, city, state)
+            seeking = self.random.random() < 0.25
+            row = dict(id=id, name=name, city=city, state=state, seeking_venue=seeking,
+                       seeking_description='Looking for shows to perform at.' if seeking else '',
+                       **self._contact('artist', id, name))
+            yield row, self._genres_of(1, 3)
+
+    def shows(self, count, venue_ids, artist_ids, days=730, upcoming=0.3):
+        """Yields show rows spread over days days, upcoming of them in the future.
+
+        Busy venues get many more shows than quiet ones and popular artists
+        play far more often, but neither a venue nor an artist is booked
+        twice on one day, so no two shows of either overlap. Shows are
+        yielded venue by venue.
+        """
+        venue_ids = list(venue_ids)
+        artist_ids = list(artist_ids)
+        first_day = self.now.date() - datetime.timedelta(days=int(days * (1 - upcoming)))
+        weights = [self.random.lognormvariate(0, 0.75) for id in venue_ids]
+        quotas = _apportion(count, weights, days)
+        # one bit per (artist, day): 90MB covers a million artists over two years
+        booked = bytearray((len(artist_ids) * days + 7) // 8)
+        updated_at = self.now
+        for venue_id, quota in zip(venue_ids, quotas):
+            for day in sorted(self.random.sample(range(days), quota)):
+                start = datetime.datetime.combine(first_day + datetime.timedelta(days=day), datetime.time(
+                    self.random.choices(self._hours, cum_weights=self._hour_weights)[0],
+                    self.random.choice((0, 0, 30))))
+                duration = self.random.choices(self._durations, cum_weights=self._duration_weights)[0]
+                artist = self._free_artist(booked, len(artist_ids), days, day)
+                yield dict(start_time=start, duration=duration,
+                           end_time=start + datetime.timedelta(minutes=duration),
+                           venue_id=venue_id, artist_id=artist_ids[artist], updated_at=updated_at)
+
+    def _free_artist(self, booked, artists, days, day):
+        # squaring a uniform draw skews bookings towards the first artists; a
+        # few redraws keep that skew when popular artists are taken, then the
+        # next free artist is used
+        for attempt in range(8):
+            artist = int(artists * self.random.random() ** 2)
+            bit = artist * days + day
+            if not booked[bit >> 3] & (1 << (bit & 7)):
+                break
+        else:
+            for artist in range(artist, artist + artists):
+                artist %= artists
+                bit = artist * days + day
+                if not booked[bit >> 3] & (1 << (bit & 7)):
+                    break
+            else:
+                raise ValueError('every one of {} artists already plays on day {}'.format(artists, day))
+        booked[bit >> 3] |= 1 << (bit & 7)
+        return artist
+
+    def _city(self):
+        return self.random.choices(self._cities, cum_weights=self._city_weights)[0]
+
+    def _genres_of(self, least, most):
+        genres = set()
+        for i in range(self.random.randint(least, most)):
+            genres.add(self.random.choices(self._genres, cum_weights=self._genre_weights)[0])
+        return sorted(genres)
+
+    def _pick(self, words):
+        return words[self.random.randrange(len(words))]
+
+    def _unique(self, name, city, state):
+        # counts per (name, city, state) rather than remembering every name taken
+        self._names[name, city, state] += 1
+        seen = self._names[name, city, state]
+        return name if seen == 1 else '{} {}'.format(name, seen)
+
+    def _contact(self, kind, id, name):
+        slug = ''.join(c for c in name.lower().replace(' ', '-') if c.isalnum() or c == '-')
+        return dict(
+            phone='{}-{}-{:04d}'.format(self.random.randint(201, 989), self.random.randint(200, 999),
+                                        self.random.randint(0, 9999)),
+            image_link='https://picsum.photos/seed/{}{}/300/300'.format(kind, id),
+            facebook_link='https://www.facebook.com/{}'.format(slug),
+            website='https://{}.example.com'.format(slug),
+            upcoming_shows_count=0,
+            updated_at=self.now)
+
+
+def _apportion(count, weights, most):
+    # splits count in proportion to weights, no share above most
+    capacity = most * len(weights)
+    if count > capacity:
+        raise ValueError('{} shows do not fit in {} venues over {} days'.format(count, len(weights), most))
+    total = sum(weights)
+    shares = [min(most, int(count * weight / total)) for weight in weights]
+    short = count - sum(shares)
+    i = 0
+    while short:
+        if shares[i] < most:
+            shares[i] += 1
+            short -= 1
+        i = (i + 1) % len(shares)
+    return shares
@@ -6,13 +6,16 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest -q", capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(baseline="bench-baseline.json"):
+    # fails when a route got slower or runs more queries than the saved baseline
+    local("python bench.py --compare {}".format(baseline))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,9 +42,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # timings on a dyno mean little: run each benchmark once, as a plain test
+    local("heroku run python -m pytest -q --benchmark-disable")
 
 
 def deploy():
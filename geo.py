@@ -0,0 +1,177 @@
+import csv
+import heapq
+import math
+import threading
+
+
+EARTH_RADIUS_MILES = 3958.8
+
+# miles per degree of latitude, and of longitude at the equator
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * math.pi / 180
+
+
+def normalize_place(name):
+    # "St. Louis", "st louis" and "Saint Louis" are one place
+    words = name.casefold().replace('.', ' ').split()
+    return ' '.join('st' if word == 'saint' else word for word in words)
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Great-circle distance in miles (haversine)."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius):
+    """The (south, west, north, east) box holding every point within radius miles."""
+    span = radius / MILES_PER_DEGREE
+    south, north = max(-90.0, lat - span), min(90.0, lat + span)
+    cos = math.cos(math.radians(max(abs(south), abs(north))))
+    if cos * 180 <= span:
+        # near a pole every longitude is close
+        return south, -180.0, north, 180.0
+    span /= cos
+    return south, max(-180.0, lng - span), north, min(180.0, lng + span)
+
+
+class Geocoder(object):
+    """Offline geocoding of a (city, state) to a bundled centroid.
+
+    The table is a CSV of city, state, latitude, longitude; rows with an
+    empty city hold the centroid of their state, which is the answer for a
+    city missing from the table.
+    """
+
+    def __init__(self, rows=()):
+        self._centroids = {}
+        for city, state, latitude, longitude in rows:
+            self._centroids[normalize_place(city), state.strip().upper()] = (float(latitude), float(longitude))
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file)
+            return cls([(row['city'], row['state'], row['latitude'], row['longitude']) for row in reader])
+
+    def __len__(self):
+        return len(self._centroids)
+
+    def locate(self, city, state):
+        """Returns (latitude, longitude), or None for an unknown state."""
+        state = (state or '').strip().upper()
+        return self._centroids.get((normalize_place(city or ''), state)) or self._centroids.get(('', state))
+
+
+class GridIndex(object):
+    """Points bucketed into square cells of cell degrees.
+
+    A box query visits only the cells it overlaps. Venues geocoded offline
+    share the centroid of their city, so a cell maps each distinct point to
+    the ids located there, and a radius query computes one distance per
+    point rather than per venue. The grid is shared by the request threads
+    and changed on commit, so every public method holds its lock.
+    """
+
+    def __init__(self, cell=0.25):
+        self.cell = cell
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def _key(self, lat, lng):
+        return int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell))
+
+    def add(self, id, lat, lng):
+        with self._lock:
+            self._discard(id)
+            if lat is None or lng is None:
+                return
+            self._points[id] = (lat, lng)
+            self._cells.setdefault(self._key(lat, lng), {}).setdefault((lat, lng), set()).add(id)
+
+    def discard(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        point = self._points.pop(id, None)
+        if point is None:
+            return
+        key = self._key(*point)
+        points = self._cells[key]
+        points[point].discard(id)
+        if not points[point]:
+            del points[point]
+            if not points:
+                del self._cells[key]
+
+    def _cells_in(self, south, west, north, east):
+        # (key, points) of the occupied cells overlapping the box, looked up
+        # one by one, or filtered from all occupied cells when there are fewer
+        (bottom, left), (top, right) = self._key(south, west), self._key(north, east)
+        if (top - bottom + 1) * (right - left + 1) > len(self._cells):
+            return [(key, points) for key, points in self._cells.items()
+                    if bottom <= key[0] <= top and left <= key[1] <= right]
+        return [((row, column), self._cells[row, column]) for row in range(bottom, top + 1)
+                for column in range(left, right + 1) if (row, column) in self._cells]
+
+    def _points_in(self, south, west, north, east):
+        for key, points in self._cells_in(south, west, north, east):
+            for point, ids in points.items():
+                if south <= point[0] <= north and west <= point[1] <= east:
+                    yield point, ids
+
+    def within_box(self, south, west, north, east):
+        """Returns the ids located inside the box, in no particular order.
+
+        The box must not cross the antimeridian (west <= east).
+        """
+        with self._lock:
+            return [id for point, ids in self._points_in(south, west, north, east) for id in ids]
+
+    def count(self, south, west, north, east):
+        """Returns the number of ids located inside the box."""
+        with self._lock:
+            return sum(len(ids) for point, ids in self._points_in(south, west, north, east))
+
+    def nearby(self, lat, lng, radius, limit=None):
+        """Returns up to limit (miles, id) pairs within radius miles, nearest first.
+
+        Cells are visited nearest first, and with a limit the search stops at
+        the first cell farther away than the limit-th match found so far, so
+        a dense city costs a few cells rather than the whole radius.
+        """
+        with self._lock:
+            return self._nearby(lat, lng, radius, limit)
+
+    def _nearby(self, lat, lng, radius, limit):
+        cell = self.cell
+        cells = []
+        for (row, column), points in self._cells_in(*bounding_box(lat, lng, radius)):
+            # the distance to the nearest point of the cell, shaded to stay a
+            # lower bound on the sphere
+            nearest = 0.999 * distance(lat, lng, min(max(lat, row * cell), (row + 1) * cell),
+                                       min(max(lng, column * cell), (column + 1) * cell))
+            if nearest <= radius:
+                cells.append((nearest, points))
+        cells.sort(key=lambda cell: cell[0])
+        matches = []
+        for nearest, points in cells:
+            if limit is not None and len(matches) == limit and nearest > matches[-1][0]:
+                break
+            for (point_lat, point_lng), ids in points.items():
+                miles = distance(lat, lng, point_lat, point_lng)
+                if miles > radius:
+                    continue
+                # a whole city can sit on one point: only its lowest ids can place
+                ids = sorted(ids) if limit is None else heapq.nsmallest(limit, ids)
+                matches.extend((miles, id) for id in ids)
+            matches.sort()
+            if limit is not None:
+                del matches[limit:]
+        return matches
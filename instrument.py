@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_lists = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_space = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    # reduces a statement to its shape so the same query with different
+    # parameters counts as a duplicate
+    statement = _literals.sub('?', statement)
+    statement = _space.sub(' ', statement).strip()
+    return _lists.sub('(?)', statement)
+
+
+class RequestStats(object):
+    """SQL and template timings gathered while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.render_started = None
+        self.profiler = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+
+    def record_query(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[fingerprint(statement)] += 1
+
+    def duplicates(self, threshold):
+        # statements run at least threshold times, the usual sign of an N+1
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(self.db_time * 1000, self.queries),
+            'render;dur={:.1f}'.format(self.render_time * 1000),
+            'total;dur={:.1f}'.format(total * 1000),
+        ])
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in sorted(labels.items())) + '}'
+
+
+class Metrics(object):
+    """Per-endpoint request totals, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix='fyyur', buckets=DURATION_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._requests = Counter()
+        self._queries = Counter()
+        self._db_time = Counter()
+        self._render_time = Counter()
+        self._duplicates = Counter()
+        self._histograms = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._durations = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, duration, stats, duplicates=0):
+        with self._lock:
+            self._requests[endpoint, method, status] += 1
+            self._queries[endpoint] += stats.queries
+            self._db_time[endpoint] += stats.db_time
+            self._render_time[endpoint] += stats.render_time
+            self._duplicates[endpoint] += duplicates
+            self._durations[endpoint] += duration
+            counts = self._histograms[endpoint]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+
+    def render(self, gauges=()):
+        # gauges are extra (name, help, labels, value) samples, e.g. cache stats
+        lines = []
+        def metric(name, kind, help, samples):
+            name = self.prefix + '_' + name
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for suffix, labels, value in samples:
+                lines.append('{}{}{} {}'.format(name, suffix, _labels(**labels), value))
+        with self._lock:
+            metric('requests_total', 'counter', 'Requests served.',
+                   [('', dict(endpoint=e, method=m, status=s), n) for (e, m, s), n in sorted(self._requests.items())])
+            histogram = []
+            for endpoint, counts in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, counts):
+                    histogram.append(('_bucket', dict(endpoint=endpoint, le=bound), count))
+                histogram.append(('_bucket', dict(endpoint=endpoint, le='+Inf'), counts[-1]))
+                histogram.append(('_sum', dict(endpoint=endpoint), self._durations[endpoint]))
+                histogram.append(('_count', dict(endpoint=endpoint), counts[-1]))
+            metric('request_duration_seconds', 'histogram', 'Time spent serving requests.', histogram)
+            for name, help, counter in (
+                    ('db_queries_total', 'SQL statements executed.', self._queries),
+                    ('db_duration_seconds_total', 'Time spent in SQL statements.', self._db_time),
+                    ('render_duration_seconds_total', 'Time spent rendering templates.', self._render_time),
+                    ('duplicate_queries_total', 'Statements repeated often enough to suggest an N+1.', self._duplicates)):
+                metric(name, 'counter', help, [('', dict(endpoint=e), v) for e, v in sorted(counter.items())])
+        by_name = defaultdict(list)
+        for name, help, labels, value in gauges:
+            by_name[name, help].append(('', labels, value))
+        for (name, help), samples in sorted(by_name.items()):
+            metric(name, 'gauge', help, samples)
+        return '\n'.join(lines) + '\n'
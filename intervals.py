@@ -0,0 +1,87 @@
+from bisect import bisect_left, insort
+
+
+class Timeline(object):
+    """The [start, end) bookings of one calendar, sorted by start.
+
+    Alongside the sorted array the timeline remembers its longest booking:
+    anything overlapping [start, end) must begin after start - longest and
+    before end, so a lookup is one bisect plus a walk over the few bookings
+    in that window however long the calendar grows. This holds even when
+    stored bookings overlap each other.
+    """
+
+    def __init__(self):
+        self._bookings = []
+        self._longest = None
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def add(self, id, start, end):
+        insort(self._bookings, (start, end, id))
+        if self._longest is None or end - start > self._longest:
+            self._longest = end - start
+
+    def discard(self, id, start, end):
+        # the longest length is kept: a wider window is slower, never wrong
+        i = bisect_left(self._bookings, (start, end, id))
+        if i < len(self._bookings) and self._bookings[i] == (start, end, id):
+            del self._bookings[i]
+
+    def overlaps(self, start, end):
+        """Returns the (start, end, id) bookings that overlap [start, end)."""
+        if not self._bookings:
+            return []
+        bookings = self._bookings
+        matches = []
+        for i in range(bisect_left(bookings, (start - self._longest,)), len(bookings)):
+            booked_start, booked_end, id = bookings[i]
+            if booked_start >= end:
+                break
+            if booked_end > start:
+                matches.append(bookings[i])
+        return matches
+
+
+class IntervalIndex(object):
+    """Bookings of shows on several calendars, e.g. a venue's and an artist's.
+
+    A show is added once with the keys of every calendar it occupies, and a
+    lookup reports the bookings on any of the given calendars that overlap
+    a period.
+    """
+
+    def __init__(self):
+        self._timelines = {}
+        self._shows = {}
+
+    def __len__(self):
+        return len(self._shows)
+
+    def add(self, id, keys, start, end):
+        self.discard(id)
+        self._shows[id] = (tuple(keys), start, end)
+        for key in keys:
+            timeline = self._timelines.get(key)
+            if timeline is None:
+                timeline = self._timelines[key] = Timeline()
+            timeline.add(id, start, end)
+
+    def discard(self, id):
+        show = self._shows.pop(id, None)
+        if show is None:
+            return
+        keys, start, end = show
+        for key in keys:
+            self._timelines[key].discard(id, start, end)
+
+    def conflicts(self, keys, start, end):
+        """Returns (key, id, start, end) for every booking overlapping [start, end)."""
+        matches = []
+        for key in keys:
+            timeline = self._timelines.get(key)
+            if timeline is not None:
+                matches.extend((key, id, booked_start, booked_end)
+                               for booked_start, booked_end, id in timeline.overlaps(start, end))
+        return matches
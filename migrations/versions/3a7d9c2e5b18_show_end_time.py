@@ -0,0 +1,76 @@
+"""add duration and end_time to Show, and no-overlap exclusion constraints
+
+Revision ID: 3a7d9c2e5b18
+Revises: f2c86d1e4b57
+Create Date: 2020-04-21 10:37:26.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7d9c2e5b18'
+down_revision = 'f2c86d1e4b57'
+branch_labels = None
+depends_on = None
+
+
+DEFAULT_DURATION = 120
+
+# one constraint per calendar: a venue, and an artist, hold one show at a time.
+# start_time and end_time have no time zone, hence tsrange over tstzrange.
+CONSTRAINTS = [
+    ('show_venue_no_overlap', 'venue_id'),
+    ('show_artist_no_overlap', 'artist_id'),
+]
+
+OVERLAPS = '''
+    SELECT a.{0}, a.id, b.id FROM "Show" a JOIN "Show" b
+      ON a.{0} = b.{0} AND a.id < b.id
+     AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time)
+    LIMIT 10
+'''
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('duration', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows get the default length. SQLite's datetime() drops the
+    # microseconds, which are carried over so the stored text stays uniform.
+    if postgresql:
+        end_time = "start_time + interval '{} minutes'".format(DEFAULT_DURATION)
+    else:
+        end_time = "datetime(start_time, '+{} minutes') || substr(start_time, 20)".format(DEFAULT_DURATION)
+    op.execute('UPDATE "Show" SET duration = {}, end_time = {}'.format(DEFAULT_DURATION, end_time))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('duration', existing_type=sa.Integer(), nullable=False,
+                              server_default=str(DEFAULT_DURATION))
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    # Elsewhere overlaps are checked against the in-process index of
+    # intervals.py. The GiST index behind each constraint also serves the
+    # conflict lookups of app.show_conflicts().
+    if not postgresql:
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    connection = op.get_bind()
+    for name, column in CONSTRAINTS:
+        # name the double bookings instead of failing on an opaque violation
+        overlaps = connection.execute(sa.text(OVERLAPS.format(column))).fetchall()
+        if overlaps:
+            raise RuntimeError('{} cannot be added, overlapping shows (id, show, show): {}'.format(
+                name, ', '.join(str(tuple(row)) for row in overlaps)))
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT {} EXCLUDE USING gist '
+                   '({} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, column in CONSTRAINTS:
+            op.drop_constraint(name, 'Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
+        batch_op.drop_column('duration')
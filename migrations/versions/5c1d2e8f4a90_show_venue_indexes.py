@@ -0,0 +1,46 @@
+"""add composite indexes for the Show and Venue hot paths
+
+Revision ID: 5c1d2e8f4a90
+Revises: 21ff9621a26c
+Create Date: 2020-03-02 10:41:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d2e8f4a90'
+down_revision = '21ff9621a26c'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+    ('ix_show_start_time_id', 'Show', ['start_time', 'id']),
+    ('ix_venue_city_state', 'Venue', ['city', 'state']),
+]
+
+
+def upgrade():
+    # On PostgreSQL the indexes are built CONCURRENTLY so the migration can run
+    # against a live database; that cannot happen inside a transaction.
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,41 @@
+"""add latitude and longitude to Venue, with a GiST index on PostgreSQL
+
+Revision ID: 7b4e1f9a2c63
+Revises: 3a7d9c2e5b18
+Create Date: 2020-04-27 15:12:48.331906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4e1f9a2c63'
+down_revision = '3a7d9c2e5b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The columns start empty; `flask geocode-venues` fills them offline from
+    # data/city_centroids.csv.
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+    # The built-in point type and its GiST operator class need no PostGIS.
+    # Other databases use the in-process grid index of geo.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_location', 'Venue', [sa.text('point(longitude, latitude)')],
+                        postgresql_using='gist', postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_venue_location', table_name='Venue', postgresql_concurrently=True)
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
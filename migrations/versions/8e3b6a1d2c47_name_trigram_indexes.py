@@ -0,0 +1,43 @@
+"""add pg_trgm indexes on Venue.name and Artist.name
+
+Revision ID: 8e3b6a1d2c47
+Revises: 5c1d2e8f4a90
+Create Date: 2020-03-09 16:02:44.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3b6a1d2c47'
+down_revision = '5c1d2e8f4a90'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_venue_name_trgm', 'Venue'),
+    ('ix_artist_name_trgm', 'Artist'),
+]
+
+
+def upgrade():
+    # Trigram indexes only exist on PostgreSQL; other databases are searched
+    # through the in-process n-gram index in search.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table in INDEXES:
+            op.create_index(name, table, ['name'], postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, table in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
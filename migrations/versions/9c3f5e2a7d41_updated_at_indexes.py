@@ -0,0 +1,46 @@
+"""index updated_at on Venue, Artist and Show for the HTTP validators
+
+Revision ID: 9c3f5e2a7d41
+Revises: 7b4e1f9a2c63
+Create Date: 2020-05-04 09:26:35.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3f5e2a7d41'
+down_revision = '7b4e1f9a2c63'
+branch_labels = None
+depends_on = None
+
+
+# max(updated_at) of a listing becomes one step down the index instead of a
+# scan of the table
+INDEXES = [
+    ('ix_venue_updated_at', 'Venue', ['updated_at']),
+    ('ix_artist_updated_at', 'Artist', ['updated_at']),
+    ('ix_show_updated_at', 'Show', ['updated_at']),
+]
+
+
+def upgrade():
+    # built CONCURRENTLY on PostgreSQL, as in the show_venue_indexes migration
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,84 @@
+"""move genres out of the comma-joined columns into Genre association tables
+
+Revision ID: b47e0f9c3d15
+Revises: 8e3b6a1d2c47
+Create Date: 2020-03-16 11:27:05.664093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e0f9c3d15'
+down_revision = '8e3b6a1d2c47'
+branch_labels = None
+depends_on = None
+
+
+# (entity table, association table, association foreign key)
+ENTITIES = [
+    ('Venue', 'venue_genres', 'venue_id'),
+    ('Artist', 'artist_genres', 'artist_id'),
+]
+
+genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, association, key in ENTITIES:
+        op.create_table(association,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [table + '.id'], ),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(association, key), association, ['genre_id', key])
+
+    # parse the existing ', '-joined strings into rows
+    connection = op.get_bind()
+    genre_ids = {}
+    for table, association, key in ENTITIES:
+        entity = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        links = []
+        for id, genres in connection.execute(sa.select([entity.c.id, entity.c.genres])):
+            names = [name.strip() for name in (genres or '').split(',') if name.strip()]
+            for name in dict.fromkeys(names):
+                if name not in genre_ids:
+                    connection.execute(genre.insert().values(name=name))
+                    genre_ids[name] = connection.execute(
+                        sa.select([genre.c.id]).where(genre.c.name == name)).scalar()
+                links.append({key: id, 'genre_id': genre_ids[name]})
+        if links:
+            op.bulk_insert(sa.table(association, sa.column(key, sa.Integer),
+                                    sa.column('genre_id', sa.Integer)), links)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    for table, association, key in ENTITIES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+        entity = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link = sa.table(association, sa.column(key, sa.Integer), sa.column('genre_id', sa.Integer))
+        genres = {}
+        rows = connection.execute(
+            sa.select([link.c[key], genre.c.name])
+            .select_from(link.join(genre, link.c.genre_id == genre.c.id))
+            .order_by(link.c[key], genre.c.name))
+        for id, name in rows:
+            genres.setdefault(id, []).append(name)
+        for id, names in genres.items():
+            connection.execute(entity.update().where(entity.c.id == id)
+                               .values(genres=', '.join(names)))
+        op.drop_table(association)
+    op.drop_table('Genre')
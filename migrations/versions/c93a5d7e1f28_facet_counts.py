@@ -0,0 +1,52 @@
+"""add the FacetCount cache and fill it from the existing rows
+
+Revision ID: c93a5d7e1f28
+Revises: b47e0f9c3d15
+Create Date: 2020-03-23 09:14:52.301775
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93a5d7e1f28'
+down_revision = 'b47e0f9c3d15'
+branch_labels = None
+depends_on = None
+
+
+# (entity, table, seeking column, association table, association foreign key)
+ENTITIES = [
+    ('venues', 'Venue', 'seeking_talent', 'venue_genres', 'venue_id'),
+    ('artists', 'Artist', 'seeking_venue', 'artist_genres', 'artist_id'),
+]
+
+
+def upgrade():
+    op.create_table('FacetCount',
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('facet', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=120), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('entity', 'facet', 'value')
+    )
+    for entity, table, seeking, association, key in ENTITIES:
+        op.execute(
+            'INSERT INTO "FacetCount" (entity, facet, value, "count") '
+            'SELECT \'{0}\', \'state\', state, count(*) FROM "{1}" GROUP BY state'
+            .format(entity, table))
+        op.execute(
+            'INSERT INTO "FacetCount" (entity, facet, value, "count") '
+            'SELECT \'{0}\', \'seeking\', CASE WHEN {2} THEN \'yes\' ELSE \'no\' END, count(*) '
+            'FROM "{1}" GROUP BY 3'
+            .format(entity, table, seeking))
+        op.execute(
+            'INSERT INTO "FacetCount" (entity, facet, value, "count") '
+            'SELECT \'{0}\', \'genre\', g.name, count(*) FROM {1} a '
+            'JOIN "Genre" g ON g.id = a.genre_id GROUP BY g.name'
+            .format(entity, association))
+
+
+def downgrade():
+    op.drop_table('FacetCount')
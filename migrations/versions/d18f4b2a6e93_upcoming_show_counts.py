@@ -0,0 +1,44 @@
+"""add materialized upcoming_shows_count to Venue and Artist
+
+Revision ID: d18f4b2a6e93
+Revises: c93a5d7e1f28
+Create Date: 2020-03-30 14:48:21.907316
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd18f4b2a6e93'
+down_revision = 'c93a5d7e1f28'
+branch_labels = None
+depends_on = None
+
+
+ENTITIES = [
+    ('Venue', 'venue_id'),
+    ('Artist', 'artist_id'),
+]
+
+
+def upgrade():
+    for table, key in ENTITIES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(),
+                                          nullable=False, server_default='0'))
+        # start_time is local time without a zone, and the app compares it
+        # with datetime.now(); CURRENT_TIMESTAMP is UTC on SQLite
+        op.execute(sa.text(
+            'UPDATE "{0}" SET upcoming_shows_count = ('
+            'SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id '
+            'AND "Show".start_time > :now)'
+            .format(table, key)).bindparams(now=datetime.datetime.now()))
+
+
+def downgrade():
+    for table, key in ENTITIES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('upcoming_shows_count')
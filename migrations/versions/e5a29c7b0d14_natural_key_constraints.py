@@ -0,0 +1,35 @@
+"""add (name, city, state) unique constraints used by the bulk upserts
+
+Revision ID: e5a29c7b0d14
+Revises: d18f4b2a6e93
+Create Date: 2020-04-06 10:05:39.472118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a29c7b0d14'
+down_revision = 'd18f4b2a6e93'
+branch_labels = None
+depends_on = None
+
+
+CONSTRAINTS = [
+    ('uq_venue_name_city_state', 'Venue'),
+    ('uq_artist_name_city_state', 'Artist'),
+]
+
+
+def upgrade():
+    # fails if duplicates already exist; merge them before upgrading
+    for name, table in CONSTRAINTS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(name, ['name', 'city', 'state'])
+
+
+def downgrade():
+    for name, table in CONSTRAINTS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
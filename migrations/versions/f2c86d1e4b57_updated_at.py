@@ -0,0 +1,37 @@
+"""add updated_at to Venue, Artist and Show for HTTP validators
+
+Revision ID: f2c86d1e4b57
+Revises: e5a29c7b0d14
+Create Date: 2020-04-14 08:52:11.640389
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c86d1e4b57'
+down_revision = 'e5a29c7b0d14'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    # SQLite cannot ADD COLUMN with a CURRENT_TIMESTAMP default, so the column
+    # is added nullable, filled, then given its default and NOT NULL.
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE "{}" SET updated_at = CURRENT_TIMESTAMP'.format(table))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(),
+                                  nullable=False, server_default=sa.func.now())
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,142 @@
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+
+def normalize(text):
+    return text.casefold()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def escape_like(term, escape='\\'):
+    # escapes the LIKE wildcards so a search term always matches literally
+    return term.replace(escape, escape * 2).replace('%', escape + '%').replace('_', escape + '_')
+
+
+class NgramIndex(object):
+    """Case-insensitive substring index over (id, name) pairs.
+
+    Every name is broken into overlapping n-grams. A term is answered by
+    intersecting the posting sets of its own n-grams, then confirming the
+    surviving candidates with a plain substring test. Terms shorter than n
+    fall back to scanning the names held in memory.
+
+    The index is shared by the request threads and changed on commit, so
+    every method holds its lock.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self._names = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, id, name):
+        with self._lock:
+            self._discard(id)
+            key = normalize(name)
+            self._names[id] = key
+            for gram in ngrams(key, self.n):
+                self._postings[gram].add(id)
+
+    def discard(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        key = self._names.pop(id, None)
+        if key is None:
+            return
+        for gram in ngrams(key, self.n):
+            ids = self._postings[gram]
+            ids.discard(id)
+            if not ids:
+                del self._postings[gram]
+
+    def search(self, term):
+        """Returns the ids whose name contains term, ordered by name."""
+        term = normalize(term)
+        grams = ngrams(term, self.n)
+        with self._lock:
+            if grams:
+                postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self._names
+            names = self._names
+            return sorted((id for id in candidates if term in names[id]),
+                          key=lambda id: (names[id], id))
+
+
+class PrefixIndex(object):
+    """As-you-type prefix index over (id, name) pairs.
+
+    Keeps one sorted array of (key, id) entries, where the keys of a name are
+    its casefolded suffixes starting at each word, so "hop" completes
+    "The Musical Hop". A lookup is a bisect to the first key with the prefix
+    followed by a short forward walk. Like NgramIndex, it holds its lock in
+    every method.
+    """
+
+    def __init__(self, pairs=()):
+        self._keys = []
+        self._entries = {}
+        self._lock = threading.Lock()
+        for id, name in pairs:
+            keys = self._word_keys(name)
+            self._entries[id] = (name, keys)
+            self._keys.extend((key, id) for key in keys)
+        self._keys.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _word_keys(name):
+        words = normalize(name).split()
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def add(self, id, name):
+        with self._lock:
+            self._discard(id)
+            keys = self._word_keys(name)
+            self._entries[id] = (name, keys)
+            for key in keys:
+                insort(self._keys, (key, id))
+
+    def discard(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        entry = self._entries.pop(id, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            del self._keys[bisect_left(self._keys, (key, id))]
+
+    def complete(self, prefix, limit=10):
+        """Returns up to limit (id, name) pairs with a word starting with prefix."""
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        matches = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            for i in range(bisect_left(keys, (prefix,)), len(keys)):
+                key, id = keys[i]
+                if not key.startswith(prefix):
+                    break
+                if id not in seen:
+                    seen.add(id)
+                    matches.append((id, self._entries[id][0]))
+                    if len(matches) == limit:
+                        break
+        return matches
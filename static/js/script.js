@@ -2,3 +2,31 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// As-you-type suggestions for the navbar search boxes, served by /autocomplete
+Array.prototype.forEach.call(document.querySelectorAll('input[data-autocomplete]'), function (input) {
+  var kind = input.getAttribute('data-autocomplete');
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending;
+  input.addEventListener('input', function () {
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      if (!input.value) {
+        list.innerHTML = '';
+        return;
+      }
+      var xhr = new XMLHttpRequest();
+      xhr.open('GET', '/autocomplete?type=' + kind + '&q=' + encodeURIComponent(input.value));
+      xhr.onload = function () {
+        if (xhr.status !== 200) return;
+        list.innerHTML = '';
+        JSON.parse(xhr.responseText)[kind].forEach(function (match) {
+          var option = document.createElement('option');
+          option.value = match.name;
+          list.appendChild(option);
+        });
+      };
+      xhr.send();
+    }, 100);
+  });
+});
@@ -0,0 +1,168 @@
+import functools
+import shutil
+import sys
+import threading
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app as fyyur
+import datagen
+
+
+# (venues, artists, shows) of the seeded databases; LARGE has ten times the
+# rows of SMALL, for the tests that check a cost does not grow with the data
+SMALL = (20, 100, 400)
+LARGE = (200, 1000, 4000)
+
+
+def clear_caches():
+    # the detail, page and fragment caches, so a request does its real work
+    fyyur.detail_cache.clear()
+    fyyur.page_cache.clear()
+    fyyur.app.jinja_env.fragment_cache.clear()
+
+
+def reset_state():
+    # everything the app keeps in process between requests
+    fyyur.db.session.remove()
+    clear_caches()
+    for indexes in (fyyur.name_indexes, fyyur.prefix_indexes, fyyur.booking_indexes, fyyur.geo_indexes):
+        indexes.clear()
+
+
+def use_database(path):
+    reset_state()
+    fyyur.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///{}'.format(path)
+
+
+def concurrently(write, read, rounds=20000):
+    # runs read() while another thread keeps calling write(i); returns the
+    # errors the reads raised. Threads switch as often as possible.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    done = threading.Event()
+    errors = []
+
+    def writer():
+        for i in range(rounds):
+            write(i)
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        while not done.is_set():
+            try:
+                read()
+            except Exception as e:
+                errors.append(e)
+    finally:
+        thread.join()
+        sys.setswitchinterval(interval)
+    return errors
+
+
+@pytest.fixture(scope='session')
+def app():
+    fyyur.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, IMPORT_API_TOKEN='test',
+                            PROFILE_SAMPLE_RATE=0, REPLICA_BINDS=[], SQLALCHEMY_BINDS={})
+    fyyur.app.logger.disabled = True
+    return fyyur.app
+
+
+@pytest.fixture(scope='session')
+def seeded_templates(app, tmp_path_factory):
+    # datagen databases seeded once per size, copied for every test
+    templates = {}
+
+    def template(size):
+        if size not in templates:
+            path = tmp_path_factory.mktemp('seeded') / 'fyyur.db'
+            use_database(path)
+            with app.app_context():
+                fyyur.db.create_all()
+                fyyur.seed_database(*size)
+            reset_state()
+            templates[size] = path
+        return templates[size]
+    return template
+
+
+@pytest.fixture
+def seeded(app, seeded_templates, tmp_path):
+    """Returns a function pointing the app at a fresh copy of a seeded database."""
+    def seeded(size=SMALL):
+        path = tmp_path / 'fyyur-{}-{}-{}.db'.format(*size)
+        shutil.copy(seeded_templates(size), path)
+        use_database(path)
+    yield seeded
+    reset_state()
+
+
+@pytest.fixture
+def database(seeded):
+    seeded(SMALL)
+
+
+@pytest.fixture
+def empty_database(app, tmp_path):
+    use_database(tmp_path / 'empty.db')
+    with app.app_context():
+        fyyur.db.create_all()
+    yield
+    reset_state()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class StatementCounter(object):
+    """Counts the SQL statements run while it is active."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements():
+    return StatementCounter
+
+
+@pytest.fixture
+def uncached():
+    """Returns the function emptying the caches between requests."""
+    return clear_caches
+
+
+@pytest.fixture
+def venue_form():
+    """Returns a function building the fields the venue form posts (datagen.form)."""
+    return functools.partial(datagen.form, 'venue')
+
+
+@pytest.fixture
+def new_venue(venue_form):
+    """Returns a function building an unsaved Venue from the same fields."""
+    def new_venue(name, **fields):
+        form = venue_form(name, **fields)
+        del form['genres']
+        form['seeking_talent'] = form['seeking_talent'] == 'Yes'
+        return fyyur.Venue(**form)
+    return new_venue
@@ -0,0 +1,65 @@
+"""asgi.py serves the detail pages like the WSGI app, hooks included."""
+import asyncio
+
+import pytest
+
+import app as fyyur
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+import asgi
+
+
+def call(path):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'headers': [], 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+             'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+    response = dict(body=b'')
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b'')
+
+    async def run():
+        try:
+            await asgi.application(scope, receive, send)
+        finally:
+            for engine in asgi.engines.values():
+                await engine.dispose()
+            asgi.engines.clear()
+    asyncio.run(run())
+    return response
+
+
+@pytest.fixture
+def async_pages(app):
+    app.config['ASYNC_DETAIL_PAGES'] = True
+    yield
+    app.config['ASYNC_DETAIL_PAGES'] = False
+
+
+def test_async_page_matches_wsgi(app, database, client, async_pages, uncached):
+    uncached()
+    before = fyyur.metrics._queries['show_venue']
+    response = call('/venues/1')
+    assert response['status'] == 200
+    # the validator and detail statements, recorded through the request hooks
+    assert fyyur.metrics._queries['show_venue'] - before == 5
+    uncached()
+    assert response['body'] == client.get('/venues/1').get_data()
+
+
+def test_missing_entity_falls_through(app, database, async_pages):
+    assert call('/venues/100000')['status'] == 404
+
+
+def test_async_pages_off_by_default(app, database, monkeypatch):
+    async def detail_page(*args):
+        raise AssertionError('served by the async path')
+    monkeypatch.setattr(asgi, 'detail_page', detail_page)
+    assert call('/venues/1')['status'] == 200
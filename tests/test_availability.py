@@ -0,0 +1,77 @@
+"""Free slots of venue calendars and the availability API."""
+import datetime
+import json
+
+from werkzeug.datastructures import MultiDict
+
+import app as fyyur
+from availability import Calendar
+
+
+FRIDAY = datetime.date(2100, 1, 1)
+
+
+def at(day, hour, minute=0):
+    return datetime.datetime.combine(FRIDAY, datetime.time(hour, minute)) + datetime.timedelta(days=day)
+
+
+def windows(**args):
+    return fyyur.availability_windows(MultiDict(dict({'date': '2100-01-01'}, **args)))
+
+
+def available(client, **args):
+    return client.get('/api/v1/venues/availability', query_string=dict({'date': '2100-01-01'}, **args))
+
+
+def test_windows_past_midnight():
+    assert windows(**{'from': '22:00', 'until': '02:00', 'days': '2'}) == [
+        (at(0, 22), at(1, 2)), (at(1, 22), at(2, 2))]
+    # until defaults to midnight, the end of the evening
+    assert windows() == [(at(0, 18), at(1, 0))]
+
+
+def test_weekday_filter():
+    assert windows(days='14', weekday='fri,Saturday') == [
+        (at(day, 18), at(day + 1, 0)) for day in (0, 1, 7, 8)]
+    args = MultiDict([('date', '2100-01-01'), ('days', '14'), ('weekday', 'sun'), ('weekday', 'mon')])
+    assert [start.weekday() for start, end in fyyur.availability_windows(args)] == [6, 0, 6, 0]
+
+
+def test_slots_around_a_show_starting_before_the_window():
+    calendar = Calendar.from_rows([(1, at(0, 16), at(0, 19)), (1, at(0, 21), at(0, 22))])
+    hour = datetime.timedelta(hours=1)
+    assert calendar.free_slots(1, at(0, 18), at(1, 0), hour) == [(at(0, 19), at(0, 21)), (at(0, 22), at(1, 0))]
+    assert calendar.free_slots(1, at(0, 18), at(1, 0), 3 * hour) == []
+    # a long show far before the window still reaches into it
+    calendar.add(1, at(0, 6), at(0, 23))
+    assert calendar.free_slots(1, at(0, 18), at(1, 0), hour) == [(at(0, 23), at(1, 0))]
+    assert calendar.available([1, 2], [(at(0, 18), at(1, 0))], 2 * hour) == {2: [(at(0, 18), at(1, 0))]}
+
+
+def test_api_respects_bookings_past_midnight(app, database, client):
+    show = dict(venue_id=1, artist_id=1, start_time='2100-01-01 23:00:00', duration=120)
+    client.post('/shows/import', data=json.dumps([show]), content_type='application/json',
+                headers={'Authorization': 'Bearer test'})
+    venues = available(client, **{'from': '22:00', 'until': '02:00', 'length': '90', 'limit': '5'}).get_json()['data']
+    assert [venue['id'] for venue in venues] == [2, 3, 4, 5, 6]
+    venues = available(client, **{'from': '20:00', 'until': '02:00', 'length': '180', 'limit': '1'}).get_json()['data']
+    assert venues[0]['id'] == 1
+    assert venues[0]['slots'] == [dict(start='2100-01-01T20:00:00', end='2100-01-01T23:00:00')]
+
+
+def test_after_cursor_pages_through_the_venues(app, database, client):
+    everything = available(client, days='3').get_json()
+    ids = []
+    after = 0
+    while after is not None:
+        page = available(client, days='3', limit='7', after=after).get_json()
+        ids.extend(venue['id'] for venue in page['data'])
+        after = page['next']
+    assert ids == [venue['id'] for venue in everything['data']]
+    assert everything['next'] is None
+
+
+def test_malformed_windows_are_bad_requests(app, database, client):
+    for args in (dict(days='0'), dict(days='400'), dict(days='week'), dict(weekday='someday'),
+                 dict(date='2100-13-01'), {'from': '25:00'}):
+        assert available(client, **args).status_code == 400, args
@@ -0,0 +1,84 @@
+"""pytest-benchmark cases for the routes bench.py measures.
+
+Every round requests the route through the test client with the caches
+emptied first, against a copy of the SMALL datagen database. Compare runs
+with --benchmark-autosave and --benchmark-compare; bench.py remains the tool
+for large seeded databases and PostgreSQL.
+"""
+import datetime
+import itertools
+
+import pytest
+
+
+GET_ROUTES = [
+    '/',
+    '/autocomplete?q=the',
+    '/venues',
+    '/venues?genre=Jazz&state=NY&seeking=yes',
+    '/venues/1',
+    '/venues/create',
+    '/venues/1/edit',
+    '/artists',
+    '/artists?genre=Rock+n+Roll&state=CA',
+    '/artists/1',
+    '/artists/create',
+    '/artists/1/edit',
+    '/shows',
+    '/shows?upcoming=1',
+    '/shows/create',
+    '/api/v1/venues',
+    '/api/v1/venues/1',
+    '/api/v1/artists',
+    '/api/v1/artists/1',
+    '/api/v1/shows?upcoming=1',
+    '/api/v1/venues/nearby?city=New+York&state=NY&radius=20',
+    '/api/v1/venues/availability?state=TX&weekday=fri&days=30&length=180',
+    '/cache/stats',
+    '/metrics',
+]
+
+
+@pytest.mark.parametrize('url', GET_ROUTES)
+def test_get(benchmark, database, client, uncached, url):
+    def get():
+        response = client.get(url)
+        response.get_data()
+        return response
+    response = benchmark.pedantic(get, setup=uncached, rounds=20, warmup_rounds=1)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('url, field', [('/venues/search', 'search_term'), ('/artists/search', 'search_term')])
+def test_search(benchmark, database, client, uncached, url, field):
+    response = benchmark.pedantic(lambda: client.post(url, data={field: 'the'}), setup=uncached, rounds=20)
+    assert response.status_code == 200
+
+
+def test_export(benchmark, database, client, uncached):
+    get = lambda: client.get('/export/shows.ndjson', headers={'Authorization': 'Bearer test'}).get_data()
+    body = benchmark.pedantic(get, setup=uncached, rounds=20)
+    assert body.count(b'\n') == 400
+
+
+def test_venue_create(benchmark, database, client, venue_form):
+    names = ('Bench venue {}'.format(i) for i in itertools.count())
+    response = benchmark.pedantic(lambda: client.post('/venues/create', data=venue_form(next(names))), rounds=20)
+    assert b'successfully listed' in response.data
+
+
+def test_show_import(benchmark, database, client):
+    # 100 shows per request, each batch a day-by-day run far in the future
+    batches = itertools.count()
+
+    def body():
+        start = datetime.datetime(2100, 1, 1, 20) + datetime.timedelta(days=100 * next(batches))
+        return [dict(artist_id=1 + i % 50, venue_id=1 + i % 20,
+                     start_time=(start + datetime.timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'))
+                for i in range(100)]
+
+    def post():
+        return client.post('/shows/import', json=body(), headers={'Authorization': 'Bearer test'})
+    response = benchmark.pedantic(post, rounds=10)
+    assert response.status_code == 200
+    assert response.get_json()['errors'] == []
@@ -0,0 +1,121 @@
+"""Double bookings are refused by the show form and the import."""
+import datetime
+import json
+import random
+
+import pytest
+
+import app as fyyur
+from intervals import IntervalIndex
+
+
+NIGHT = datetime.datetime(2100, 1, 1, 20)
+
+
+def at(minutes):
+    return (NIGHT + datetime.timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def show(venue_id, artist_id, minutes, duration=120):
+    return dict(venue_id=venue_id, artist_id=artist_id, start_time=at(minutes), duration=duration)
+
+
+def import_shows(client, rows):
+    return client.post('/shows/import', data=json.dumps(rows), content_type='application/json',
+                       headers={'Authorization': 'Bearer test'}).get_json()
+
+
+def stored_shows(app):
+    with app.app_context():
+        return fyyur.Show.query.count()
+
+
+def test_form_refuses_an_overlap(app, database, client):
+    assert b'Show was successfully listed!' in client.post('/shows/create', data=show(1, 1, 0)).get_data()
+    before = stored_shows(app)
+    page = client.post('/shows/create', data=show(1, 2, 60)).get_data()
+    assert b'Show could not be listed: venue 1 is already booked from 2100-01-01 20:00 to 2100-01-01 22:00' in page
+    assert stored_shows(app) == before
+    # [start, end): the next show may begin as this one ends
+    assert b'Show was successfully listed!' in client.post('/shows/create', data=show(1, 2, 120)).get_data()
+
+
+def test_import_refuses_overlaps_with_stored_shows_and_earlier_rows(app, database, client):
+    assert import_shows(client, [show(1, 1, 0)])['inserted'] == 1
+    with app.app_context():
+        stored = fyyur.db.session.query(fyyur.func.max(fyyur.Show.id)).scalar()
+    result = import_shows(client, [show(1, 2, 90), show(2, 2, 24 * 60), show(3, 2, 25 * 60), show(3, 3, 26 * 60)])
+    assert result['inserted'] == 2
+    assert result['errors'] == [
+        dict(row=1, errors=['venue 1 is already booked from 2100-01-01 20:00 to 2100-01-01 22:00 (show {})'.format(stored)]),
+        dict(row=3, errors=['artist 2 is already booked from 2100-01-02 20:00 to 2100-01-02 22:00 (row 2)']),
+    ]
+
+
+def test_duration_validation(app, database, client):
+    with app.app_context():
+        assert fyyur.parse_duration(None) == fyyur.parse_duration(' ') == app.config['SHOW_DURATION']
+        assert fyyur.parse_duration(' 90 ') == 90
+        assert fyyur.parse_duration(fyyur.MAX_SHOW_DURATION) == fyyur.MAX_SHOW_DURATION
+        for value in (0, '0', '-5', '1.5', 'long', fyyur.MAX_SHOW_DURATION + 1):
+            with pytest.raises(ValueError):
+                fyyur.parse_duration(value)
+
+    before = stored_shows(app)
+    result = import_shows(client, [show(1, 1, 0, duration=0)])
+    assert result['errors'] == [dict(row=1, errors=['duration must be between 1 and 1440 minutes'])]
+    page = client.post('/shows/create', data=show(1, 1, 0, duration='forever')).get_data()
+    assert b'An error occurred. Show could not be listed.' in page
+    assert stored_shows(app) == before
+
+
+def test_booking_index_follows_commits_only(app, database):
+    with app.app_context():
+        start, end = NIGHT, NIGHT + datetime.timedelta(hours=2)
+        keys = fyyur.booking_keys(1, 1)
+        assert fyyur.booking_index().conflicts(keys, start, end) == []
+
+        fyyur.db.session.add(fyyur.Show(venue_id=1, artist_id=1, start_time=start, duration=120))
+        fyyur.db.session.flush()
+        fyyur.db.session.rollback()
+        assert fyyur.booking_index().conflicts(keys, start, end) == []
+
+        booked = fyyur.Show(venue_id=1, artist_id=1, start_time=start, duration=120)
+        fyyur.db.session.add(booked)
+        fyyur.db.session.commit()
+        assert [id for key, id, booked_start, booked_end in fyyur.booking_index().conflicts(keys, start, end)] == \
+            [booked.id, booked.id]
+
+        fyyur.db.session.delete(booked)
+        fyyur.db.session.flush()
+        fyyur.db.session.rollback()
+        assert len(fyyur.booking_index().conflicts(keys, start, end)) == 2
+        fyyur.db.session.delete(fyyur.db.session.get(fyyur.Show, booked.id))
+        fyyur.db.session.commit()
+        assert fyyur.booking_index().conflicts(keys, start, end) == []
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(0)
+    index = IntervalIndex()
+    shows = {}
+    for step in range(3000):
+        id = rng.randrange(400)
+        if rng.random() < 0.3:
+            index.discard(id)
+            shows.pop(id, None)
+        else:
+            keys = (('venue', rng.randrange(5)), ('artist', rng.randrange(5)))
+            start = rng.randrange(2000)
+            end = start + rng.choice((1, 10, 60, 300))
+            index.add(id, keys, start, end)
+            shows[id] = (keys, start, end)
+        if step % 10 == 0:
+            keys = (('venue', rng.randrange(5)), ('artist', rng.randrange(5)))
+            start = rng.randrange(2000)
+            end = start + rng.randrange(1, 300)
+            expected = sorted((key, id, booked_start, booked_end)
+                              for id, (booked_keys, booked_start, booked_end) in shows.items()
+                              for key in keys if key in booked_keys and booked_start < end and start < booked_end)
+            assert sorted(index.conflicts(keys, start, end)) == expected
+    assert len(index) == len(shows)
@@ -0,0 +1,62 @@
+"""The detail cache backends behave alike."""
+import fnmatch
+
+import pytest
+
+from cache import LRUCache, RedisCache
+
+
+class FakeRedis(object):
+    """The few redis.Redis methods RedisCache uses, over a dict; no expiry."""
+
+    def __init__(self):
+        self.data = {}
+        self.deletes = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        self.deletes += 1
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match='*', count=None):
+        return iter([key for key in self.data if fnmatch.fnmatchcase(key, match)])
+
+
+@pytest.fixture(params=['lru', 'redis'])
+def cache(request):
+    if request.param == 'lru':
+        return LRUCache()
+    return RedisCache(FakeRedis())
+
+
+def test_get_set_delete(cache):
+    assert cache.get('venue:1') is None
+    cache.set('venue:1', dict(name='The Musical Hop'))
+    assert cache.get('venue:1') == dict(name='The Musical Hop')
+    cache.delete('venue:1', 'artist:4')
+    assert cache.get('venue:1') is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_clear(cache):
+    for id in range(5):
+        cache.set('venue:{}'.format(id), id)
+    cache.clear()
+    assert all(cache.get('venue:{}'.format(id)) is None for id in range(5))
+
+
+def test_redis_clear_keeps_other_keys_and_batches():
+    client = FakeRedis()
+    client.data['session:1'] = b'kept'
+    cache = RedisCache(client)
+    for id in range(7):
+        cache.set('venue:{}'.format(id), id)
+    cache.clear(batch_size=3)
+    assert client.data == {'session:1': b'kept'}
+    assert client.deletes == 3
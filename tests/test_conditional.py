@@ -0,0 +1,69 @@
+"""ETag and Last-Modified validation of the listing and detail pages."""
+import datetime
+
+import app as fyyur
+
+
+def get(client, url, **headers):
+    # reads and closes the body as a server would: /shows streams
+    response = client.get(url, headers=headers)
+    response.get_data()
+    response.close()
+    return response
+
+
+def revalidate(client, url, response):
+    return get(client, url, **{'If-None-Match': response.headers['ETag']})
+
+
+def touch_show(app, position):
+    # edits the show at position in the /shows order
+    with app.app_context():
+        show = fyyur.Show.query.order_by(fyyur.Show.start_time, fyyur.Show.id).offset(position).first()
+        show.duration += 1
+        fyyur.db.session.commit()
+
+
+def test_unchanged_page_is_not_modified(app, database, client):
+    for url in ('/venues', '/artists', '/shows', '/shows?upcoming=1', '/venues/1', '/artists/1'):
+        response = get(client, url)
+        assert response.status_code == 200 and 'ETag' in response.headers, url
+        again = revalidate(client, url, response)
+        assert again.status_code == 304, url
+        assert again.headers['ETag'] == response.headers['ETag']
+
+
+def test_shows_validators_cover_the_page_only(app, database, client):
+    response = get(client, '/shows')
+    touch_show(app, app.config['SHOWS_PER_PAGE'] + 5)
+    assert revalidate(client, '/shows', response).status_code == 304
+    touch_show(app, 3)
+    changed = revalidate(client, '/shows', response)
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != response.headers['ETag']
+
+
+def test_bad_cursor_skips_validation(app, database, client):
+    assert get(client, '/shows?after=nonsense').status_code == 400
+
+
+def test_if_modified_since(app, database, client):
+    response = client.get('/venues/1')
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/venues/1', headers={'If-Modified-Since': last_modified}).status_code == 304
+    earlier = response.last_modified - datetime.timedelta(seconds=1)
+    assert client.get('/venues/1', headers={
+        'If-Modified-Since': earlier.strftime('%a, %d %b %Y %H:%M:%S GMT')}).status_code == 200
+    # If-None-Match takes precedence over If-Modified-Since
+    assert client.get('/venues/1', headers={
+        'If-None-Match': '"other"', 'If-Modified-Since': last_modified}).status_code == 200
+
+
+def test_pending_flash_bypasses_validation(app, database, client):
+    response = client.get('/venues')
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Venue Zydeco Hall was successfully listed!')]
+    flashed = revalidate(client, '/venues', response)
+    assert flashed.status_code == 200
+    assert b'Zydeco Hall was successfully listed' in flashed.get_data()
+    assert revalidate(client, '/venues', response).status_code == 304
@@ -0,0 +1,35 @@
+"""The materialized upcoming show counts follow show writes."""
+import datetime
+
+import app as fyyur
+
+
+def stored_counts():
+    return {(model.__name__, id): count for model in (fyyur.Venue, fyyur.Artist)
+            for id, count in fyyur.db.session.query(model.id, model.upcoming_shows_count)}
+
+
+def recomputed_counts():
+    fyyur.refresh_upcoming_counts()
+    return stored_counts()
+
+
+def test_moved_shows_update_counts(app, database):
+    with app.app_context():
+        now = datetime.datetime.now()
+        past = fyyur.Show.query.filter(fyyur.Show.start_time < now).order_by(fyyur.Show.id).first()
+        upcoming = fyyur.Show.query.filter(fyyur.Show.start_time > now).order_by(fyyur.Show.id).first()
+        other_venue = fyyur.db.session.query(fyyur.func.max(fyyur.Venue.id)).scalar()
+        other_artist = fyyur.db.session.query(fyyur.func.max(fyyur.Artist.id)).scalar()
+
+        # into the future, and to another venue and artist while upcoming
+        past.start_time = datetime.datetime(2999, 1, 1, 20)
+        upcoming.venue_id = other_venue
+        upcoming.artist_id = other_artist
+        fyyur.db.session.commit()
+        assert stored_counts() == recomputed_counts()
+
+        # back into the past
+        upcoming.start_time = datetime.datetime(2000, 1, 1, 20)
+        fyyur.db.session.commit()
+        assert stored_counts() == recomputed_counts()
@@ -0,0 +1,40 @@
+"""Bulk venue and artist import upserts by (name, city, state)."""
+import app as fyyur
+
+
+def import_venues(app, records):
+    # the import requires every text column, seeking_description included
+    records = [dict(record, seeking_description=record['seeking_description'] or 'Bands wanted.')
+               for record in records]
+    with app.app_context():
+        return fyyur.import_entities(fyyur.Venue, records, 100)
+
+
+def genres_of(app, name, city):
+    with app.app_context():
+        venue = fyyur.Venue.query.filter_by(name=name, city=city).one()
+        return sorted(genre.name for genre in venue.genres)
+
+
+def test_same_name_elsewhere_keeps_its_genres(app, database, venue_form):
+    chicago = venue_form('Blue Note', ['Blues', 'Jazz'], city='Chicago', state='IL')
+    assert import_venues(app, [chicago]) == (1, [])
+    assert import_venues(app, [venue_form('Blue Note', ['Soul'])]) == (1, [])
+    assert genres_of(app, 'Blue Note', 'Chicago') == ['Blues', 'Jazz']
+    assert genres_of(app, 'Blue Note', 'Austin') == ['Soul']
+
+    # and a re-import replaces the genres of its own key only
+    assert import_venues(app, [dict(chicago, genres=['Funk'])]) == (1, [])
+    assert genres_of(app, 'Blue Note', 'Chicago') == ['Funk']
+    assert genres_of(app, 'Blue Note', 'Austin') == ['Soul']
+
+
+def test_reimport_refreshes_counterpart_pages(app, database, client, venue_form):
+    with app.app_context():
+        show = fyyur.Show.query.order_by(fyyur.Show.id).first()
+        venue, artist_id = show.venues, show.artist_id
+        record = venue_form(venue.name, [genre.name for genre in venue.genres], city=venue.city, state=venue.state,
+                            image_link='https://picsum.photos/seed/reimported/300')
+    assert b'seed/reimported' not in client.get('/artists/{}'.format(artist_id)).get_data()
+    assert import_venues(app, [record]) == (1, [])
+    assert b'seed/reimported' in client.get('/artists/{}'.format(artist_id)).get_data()
@@ -0,0 +1,18 @@
+"""Bulk export."""
+import pytest
+
+
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer wrong'}, {'Authorization': 'Basic test'}])
+def test_export_requires_the_api_token(database, client, headers):
+    assert client.get('/export/venues.csv', headers=headers).status_code == 403
+
+
+def test_export_is_disabled_without_a_token(app, database, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_API_TOKEN', None)
+    assert client.get('/export/venues.csv', headers={'Authorization': 'Bearer test'}).status_code == 403
+
+
+def test_export_with_the_api_token(database, client):
+    response = client.get('/export/venues.csv', headers={'Authorization': 'Bearer test'})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('\n') == 21
@@ -0,0 +1,28 @@
+"""The cached facet counts follow venue and artist writes."""
+import app as fyyur
+
+
+def facet_count(app, facet, value):
+    with app.app_context():
+        row = fyyur.FacetCount.query.get(('venues', facet, value))
+        return row and row.count
+
+
+def test_new_facet_value_is_upserted(app, database, client, venue_form):
+    assert facet_count(app, 'genre', 'Zydeco') is None
+    for name in ('Zydeco Hall', 'Zydeco Lounge'):
+        assert b'successfully listed' in client.post('/venues/create', data=venue_form(name, ['Zydeco'])).data
+    assert facet_count(app, 'genre', 'Zydeco') == 2
+
+    with app.app_context():
+        id = fyyur.Venue.query.filter_by(name='Zydeco Hall').one().id
+    client.post('/venues/{}/delete'.format(id))
+    assert facet_count(app, 'genre', 'Zydeco') == 1
+
+
+def test_counts_match_a_rebuild(app, database, client, venue_form):
+    client.post('/venues/create', data=venue_form('Zydeco Hall', ['Zydeco', 'Jazz']))
+    with app.app_context():
+        counts = {(row.entity, row.facet, row.value): row.count for row in fyyur.FacetCount.query if row.count}
+        fyyur.rebuild_facet_counts()
+        assert counts == {(row.entity, row.facet, row.value): row.count for row in fyyur.FacetCount.query}
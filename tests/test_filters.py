@@ -0,0 +1,38 @@
+"""The datetime template filter."""
+import datetime
+
+import babel.dates
+import pytest
+
+import app as fyyur
+
+
+SHOW_TIME = datetime.datetime(2026, 5, 21, 21, 30)
+
+
+@pytest.mark.parametrize('format, expected', [
+    ('full', 'Thursday May, 21, 2026 at 9:30PM'),
+    ('medium', 'Thu 05, 21, 2026 9:30PM'),
+])
+def test_format_datetime(app, format, expected):
+    with app.app_context():
+        assert fyyur.format_datetime(SHOW_TIME, format) == expected
+        assert fyyur.format_datetime(SHOW_TIME.isoformat(), format) == expected
+
+
+def test_format_datetime_ignores_missing_environment_locale(app, monkeypatch):
+    monkeypatch.setattr(babel.dates, 'LC_TIME', None)
+    with app.app_context():
+        assert fyyur.format_datetime(SHOW_TIME, 'full') == 'Thursday May, 21, 2026 at 9:30PM'
+
+
+def test_format_datetime_keeps_the_time_zone(app):
+    eastern = datetime.timezone(datetime.timedelta(hours=-5))
+    with app.app_context():
+        assert fyyur.format_datetime(SHOW_TIME.replace(tzinfo=eastern), "h:mma xxx") == '9:30PM -05:00'
+
+
+def test_format_datetime_benchmark(benchmark, app):
+    # the per-show cost of the filter on every show listing
+    with app.app_context():
+        assert benchmark(fyyur.format_datetime, SHOW_TIME, 'full') == 'Thursday May, 21, 2026 at 9:30PM'
@@ -0,0 +1,35 @@
+"""Genres are shared rows, created on first use."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app as fyyur
+
+
+@pytest.fixture
+def concurrent_genre(app):
+    # commits the genre from another connection just before the session
+    # inserts it, as a concurrent create would
+    def insert(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO "Genre"') and not inserted:
+            inserted.append(True)
+            with fyyur.db.engine.connect() as other:
+                other.execute(fyyur.Genre.__table__.insert().values(name='Zydeco'))
+    inserted = []
+    event.listen(Engine, 'before_cursor_execute', insert)
+    yield
+    event.remove(Engine, 'before_cursor_execute', insert)
+
+
+def test_genre_created_concurrently(app, database, concurrent_genre):
+    with app.app_context():
+        genres = fyyur.get_genres(['Zydeco', 'Jazz'])
+        fyyur.db.session.commit()
+        assert [genre.name for genre in genres] == ['Zydeco', 'Jazz']
+        assert fyyur.Genre.query.filter_by(name='Zydeco').count() == 1
+
+
+def test_names_are_deduplicated_in_order(app, database):
+    with app.app_context():
+        genres = fyyur.get_genres(['Zydeco', 'Jazz', 'Zydeco'])
+        assert [genre.name for genre in genres] == ['Zydeco', 'Jazz']
@@ -0,0 +1,82 @@
+"""Bulk show import."""
+import datetime
+import json
+
+import pytest
+
+import app as fyyur
+
+
+def show(venue_id, artist_id, days):
+    start = datetime.datetime(2100, 1, 1, 20) + datetime.timedelta(days=days)
+    return dict(venue_id=venue_id, artist_id=artist_id, start_time=start.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def post(client, body, mimetype):
+    return client.post('/shows/import', data=body, content_type=mimetype, headers={'Authorization': 'Bearer test'})
+
+
+def stored_shows(app):
+    with app.app_context():
+        with fyyur.db.engine.connect() as connection:
+            return connection.execute(fyyur.select([fyyur.func.count()]).select_from(fyyur.Show.__table__)).scalar()
+
+
+def test_malformed_lines_are_row_errors(app, database, client):
+    before = stored_shows(app)
+    lines = [json.dumps(show(1, 1, 0)), '{"venue_id": 2,', '[1, 2]', json.dumps(show(2, 2, 1))]
+    response = post(client, '\n'.join(lines) + '\n', 'application/x-ndjson')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['inserted'] == 2
+    assert [error['row'] for error in result['errors']] == [2, 3]
+    assert result['errors'][0]['errors'][0].startswith('malformed JSON line')
+    assert result['errors'][1]['errors'] == ['not a JSON object']
+    assert stored_shows(app) == before + 2
+
+
+def test_ids_are_checked_in_chunks(app, database, client, monkeypatch, count_statements):
+    monkeypatch.setattr(fyyur, 'ID_CHUNK_SIZE', 3)
+    body = [show(venue_id, venue_id, venue_id) for venue_id in range(1, 11)] + [show(10**6, 1, 20)]
+    with count_statements() as statements:
+        result = post(client, json.dumps(body), 'application/json').get_json()
+    assert result['inserted'] == 10
+    assert result['errors'] == [dict(row=11, errors=['venue 1000000 does not exist'])]
+    checks = [statement for statement in statements.statements if 'IN (' in statement and 'FROM "Venue"' in statement]
+    assert len(checks) == 4
+
+
+def test_cli_reports_a_failed_import(app, database, tmp_path):
+    source = tmp_path / 'shows.json'
+    source.write_text('{"venue_id": 1}')
+    result = app.test_cli_runner().invoke(args=['import-shows', str(source)])
+    assert result.exit_code == 1
+    assert 'import failed, no shows imported: expected a JSON array' in result.output
+    assert 'Traceback' not in result.output
+
+
+@pytest.fixture
+def refused_show_insert(app, database):
+    # the database refuses the insert, as the PostgreSQL exclusion constraints
+    # do when another client booked the same slot meanwhile
+    with app.app_context():
+        with fyyur.db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                'CREATE TRIGGER refuse_show BEFORE INSERT ON "Show" BEGIN SELECT RAISE(ABORT, '
+                "'conflicting key value violates exclusion constraint \"show_venue_no_overlap\"'); END")
+
+
+def test_refused_insert_is_a_json_conflict(app, database, client, refused_show_insert):
+    before = stored_shows(app)
+    response = post(client, json.dumps([show(1, 1, 0)]), 'application/json')
+    assert response.status_code == 409
+    result = response.get_json()
+    assert result['inserted'] == 0
+    assert 'exclusion constraint "show_venue_no_overlap"' in result['error']
+    assert stored_shows(app) == before
+
+
+def test_unreadable_body_is_a_json_error(app, database, client):
+    response = post(client, '{"venue_id": 1}', 'application/json')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'import failed, no shows imported: expected a JSON array'
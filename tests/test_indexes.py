@@ -0,0 +1,72 @@
+"""The hot queries are served by the indexes the migrations create."""
+import datetime
+import os
+
+import flask_migrate
+import pytest
+
+import app as fyyur
+from tests.conftest import use_database, reset_state
+
+
+MIGRATIONS = os.path.join(os.path.dirname(fyyur.__file__), 'migrations')
+
+
+@pytest.fixture
+def migrated(app, tmp_path):
+    # the schema built by the migrations rather than db.create_all()
+    use_database(tmp_path / 'migrated.db')
+    with app.app_context():
+        flask_migrate.upgrade(MIGRATIONS)
+        yield
+    reset_state()
+
+
+def query_plan(statement):
+    # SQLite's EXPLAIN QUERY PLAN of a statement, one detail string per step
+    if hasattr(statement, 'statement'):
+        statement = statement.statement
+    compiled = statement.compile(fyyur.db.engine)
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    with fyyur.db.engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), parameters)]
+
+
+def uses_index(plan, index):
+    return any(' INDEX {}'.format(index) in step for step in plan)
+
+
+@pytest.mark.parametrize('model, index', [
+    (fyyur.Venue, 'ix_show_venue_id_start_time'),
+    (fyyur.Artist, 'ix_show_artist_id_start_time'),
+])
+def test_detail_shows_use_index(migrated, model, index):
+    entity, genres, shows = fyyur.detail_statements(model, 1)
+    updated_at, show_validators = fyyur.detail_validator_statements(model, 1)
+    for statement in (shows, show_validators):
+        plan = query_plan(statement)
+        assert uses_index(plan, index), plan
+
+
+def test_show_page_seeks_on_index(migrated):
+    with fyyur.app.test_request_context():
+        page = fyyur.load_show_page(fyyur.encode_show_cursor(fyyur.Show(id=1, start_time=datetime.datetime(2020, 1, 1))))
+    plan = query_plan(page.query.limit(page.per_page + 1))
+    assert uses_index(plan, 'ix_show_start_time_id'), plan
+
+
+def test_venues_by_place_use_index(migrated):
+    plan = query_plan(fyyur.db.session.query(fyyur.Venue.id)
+                      .filter(fyyur.Venue.city == 'Austin', fyyur.Venue.state == 'TX'))
+    assert uses_index(plan, 'ix_venue_city_state'), plan
+
+
+def test_validators_use_updated_at_indexes(migrated):
+    for model, index in ((fyyur.Venue, 'ix_venue_updated_at'), (fyyur.Artist, 'ix_artist_updated_at'),
+                         (fyyur.Show, 'ix_show_updated_at')):
+        plan = query_plan(fyyur.select([fyyur.func.max(model.updated_at)]))
+        assert uses_index(plan, index), plan
+    with fyyur.app.test_request_context('/shows'):
+        plan = query_plan(fyyur.show_page_query(fyyur.db.session.query(fyyur.Show.id, fyyur.Show.updated_at))
+                          .limit(31))
+    assert uses_index(plan, 'ix_show_start_time_id'), plan
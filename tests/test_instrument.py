@@ -0,0 +1,21 @@
+"""Request metrics cover the whole response, streamed bodies included."""
+import app as fyyur
+
+
+def test_streamed_page_is_accounted_on_close(app, database, client, count_statements, uncached):
+    uncached()
+    before = fyyur.metrics._queries['shows']
+    with count_statements() as statements:
+        response = client.get('/shows')
+        response.get_data()
+    assert fyyur.metrics._queries['shows'] == before
+    response.close()
+    assert 'Server-Timing' not in response.headers
+    assert fyyur.metrics._queries['shows'] - before == len(statements)
+
+
+def test_complete_page_has_server_timing(app, database, client, uncached):
+    uncached()
+    response = client.get('/venues')
+    response.close()
+    assert response.headers['Server-Timing'].startswith('db;dur=')
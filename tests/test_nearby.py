@@ -0,0 +1,49 @@
+"""The in-process venue grid follows committed locations only."""
+import app as fyyur
+from geo import GridIndex
+from tests.conftest import concurrently
+
+
+def nearby(client, lat, lng):
+    response = client.get('/api/v1/venues/nearby?lat={}&lng={}&radius=5'.format(lat, lng))
+    assert response.status_code == 200
+    return [venue['name'] for venue in response.get_json()['data']]
+
+
+def test_rolled_back_locations_stay_out_of_nearby(app, database, client, new_venue):
+    assert nearby(client, 10, 10) == []
+    with app.app_context():
+        venue = new_venue('Equator Lounge', latitude=10.0, longitude=10.0)
+        fyyur.db.session.add(venue)
+        moved = fyyur.Venue.query.order_by(fyyur.Venue.id).first()
+        moved_name, moved_at = moved.name, (moved.latitude, moved.longitude)
+        moved.latitude, moved.longitude = 10.01, 10.01
+        fyyur.db.session.flush()
+        fyyur.db.session.rollback()
+    assert nearby(client, 10, 10) == []
+    assert moved_name in nearby(client, *moved_at)
+
+
+def test_committed_locations_reach_nearby(app, database, client, new_venue):
+    assert nearby(client, 10, 10) == []
+    with app.app_context():
+        venue = new_venue('Equator Lounge', latitude=10.0, longitude=10.0)
+        fyyur.db.session.add(venue)
+        fyyur.db.session.commit()
+    assert nearby(client, 10, 10) == ['Equator Lounge']
+
+
+def test_lookups_while_the_grid_changes():
+    grid = GridIndex(cell=0.01)
+    for id in range(2000):
+        grid.add(id, 30 + id * 0.001, -97.0)
+
+    def write(i):
+        grid.discard(i % 2000)
+        grid.add(2000 + i, 30 + (i % 2000) * 0.001 + 0.0005, -97.0)
+
+    def read():
+        grid.within_box(29, -98, 33, -96)
+        grid.nearby(31, -97, 100, limit=50)
+
+    assert concurrently(write, read) == []
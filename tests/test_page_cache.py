@@ -0,0 +1,51 @@
+"""The anonymous page cache."""
+import app as fyyur
+
+
+def rename_elsewhere(app, model, id, name):
+    # a commit by another worker process: it skips this process's session
+    # events, so nothing here is invalidated
+    with app.app_context():
+        with fyyur.db.engine.begin() as connection:
+            connection.execute(model.__table__.update().where(model.id == id).values(name=name))
+
+
+def test_a_write_retires_cached_pages(app, database, client, venue_form):
+    assert b'Zydeco Hall' not in client.get('/venues').get_data()
+    assert fyyur.page_cache.stats()['size'] == 1
+    client.post('/venues/create', data=venue_form('Zydeco Hall'))
+    client.get('/')  # consumes the flash message, which bypasses the cache
+    assert b'Zydeco Hall' in client.get('/venues').get_data()
+
+
+def test_another_workers_write_retires_cached_pages(app, database, client):
+    before = client.get('/venues')
+    assert b'Zydeco Hall' not in before.get_data()
+    rename_elsewhere(app, fyyur.Venue, 1, 'Zydeco Hall')
+    after = client.get('/venues')
+    assert b'Zydeco Hall' in after.get_data()
+    assert after.headers['ETag'] != before.headers['ETag']
+
+
+def test_detail_refilled_before_a_commit_is_not_served_under_its_etag(app, database, client):
+    before = client.get('/venues/1')
+    stale = fyyur.detail_cache.get('venue:1')
+    assert stale[0] == before.headers['ETag'].strip('"')
+    rename_elsewhere(app, fyyur.Venue, 1, 'Zydeco Hall')
+    # a reader that loaded the venue before the commit stores it afterwards
+    fyyur.detail_cache.set('venue:1', stale)
+    after = client.get('/venues/1')
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert b'Zydeco Hall' in after.get_data()
+
+
+def test_flashed_detail_page_is_validated_against_the_cache(app, database, client):
+    client.get('/venues/1')
+    stale = fyyur.detail_cache.get('venue:1')
+    rename_elsewhere(app, fyyur.Venue, 1, 'Zydeco Hall')
+    fyyur.detail_cache.set('venue:1', stale)
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'The venue was successfully updated!')]
+    response = client.get('/venues/1')
+    assert 'ETag' not in response.headers
+    assert b'Zydeco Hall' in response.get_data()
@@ -0,0 +1,38 @@
+"""The listing and detail pages run a fixed number of SQL statements."""
+import app as fyyur
+from tests.conftest import SMALL, LARGE
+
+
+# far above what the pages run today, far below one statement per row
+MAX_STATEMENTS = 10
+
+
+def busiest(column):
+    # the venue or artist with the most shows, so a per-show query would show up
+    return fyyur.db.session.query(column).group_by(column).order_by(fyyur.func.count().desc(), column).first()[0]
+
+
+def statements_per_page(app, client, count_statements, uncached):
+    with app.app_context():
+        pages = dict(venues='/venues', artists='/artists', shows='/shows', upcoming='/shows?upcoming=1',
+                     venue='/venues/{}'.format(busiest(fyyur.Show.venue_id)),
+                     artist='/artists/{}'.format(busiest(fyyur.Show.artist_id)))
+    counts = {}
+    for page, url in pages.items():
+        uncached()
+        with count_statements() as statements:
+            response = client.get(url)
+            # /shows streams: its rows are read while the body is consumed
+            response.get_data()
+        assert response.status_code == 200
+        counts[page] = len(statements)
+    return counts
+
+
+def test_statements_do_not_grow_with_rows(app, seeded, client, count_statements, uncached):
+    seeded(SMALL)
+    small = statements_per_page(app, client, count_statements, uncached)
+    seeded(LARGE)
+    large = statements_per_page(app, client, count_statements, uncached)
+    assert large == small
+    assert max(large.values()) <= MAX_STATEMENTS, large
@@ -0,0 +1,45 @@
+"""Read replica routing and the shared caches."""
+import shutil
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def replica(app, database, tmp_path):
+    # a replica that never catches up: a copy of the database taken now
+    path = tmp_path / 'replica.db'
+    shutil.copy(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):], path)
+    app.config.update(REPLICA_BINDS=['replica0'], SQLALCHEMY_BINDS={'replica0': 'sqlite:///{}'.format(path)})
+    yield
+    app.config.update(REPLICA_BINDS=[], SQLALCHEMY_BINDS={})
+
+
+def venue_name(client):
+    return client.get('/api/v1/venues/1').get_json()['data']['name']
+
+
+def test_reads_go_to_the_replica(app, replica, client):
+    name = venue_name(client)
+    with app.app_context():
+        fyyur.db.session.get(fyyur.Venue, 1).name = 'Zydeco Hall'
+        fyyur.db.session.commit()
+    fyyur.detail_cache.clear()
+    assert venue_name(client) == name
+
+
+def test_writer_reads_its_own_write_past_refilled_caches(app, replica, client, venue_form):
+    reader = app.test_client()
+    assert client.post('/venues/1/edit', data=venue_form('Zydeco Hall')).status_code == 302
+    # another client refills the caches from the lagging replica
+    reader.get('/venues').get_data()
+    reader.get('/venues/1')
+    assert venue_name(reader) != 'Zydeco Hall'
+
+    assert venue_name(client) == 'Zydeco Hall'
+    assert b'Zydeco Hall' in client.get('/venues/1').get_data()
+    assert b'Zydeco Hall' in client.get('/venues').get_data()
+    # and leaves them as the replica readers filled them
+    assert fyyur.detail_cache.get('venue:1')[1]['name'] != 'Zydeco Hall'
+    assert fyyur.page_cache.stats()['size'] == 1
@@ -0,0 +1,69 @@
+"""The in-process name indexes follow committed data only."""
+import app as fyyur
+from search import NgramIndex, PrefixIndex
+from tests.conftest import concurrently
+
+
+def matches(model, term):
+    return [row['name'] for row in fyyur.search_by_name(model, term)['data']]
+
+
+def test_rolled_back_changes_stay_out_of_search(app, database, new_venue):
+    with app.app_context():
+        venue = fyyur.Venue.query.order_by(fyyur.Venue.id).first()
+        name = venue.name
+        assert name in matches(fyyur.Venue, name)
+
+        venue.name = 'Zyzzyva Hall'
+        fyyur.db.session.add(new_venue('Zyzzyva Lounge'))
+        fyyur.db.session.flush()
+        fyyur.db.session.rollback()
+        assert fyyur.search_by_name(fyyur.Venue, 'zyzzyva')['count'] == 0
+        assert name in matches(fyyur.Venue, name)
+
+
+def test_committed_changes_reach_search(app, database, new_venue):
+    with app.app_context():
+        venue = fyyur.Venue.query.order_by(fyyur.Venue.id).first()
+        matches(fyyur.Venue, venue.name)
+        venue.name = 'Zyzzyva Hall'
+        fyyur.db.session.add(new_venue('Zyzzyva Lounge'))
+        fyyur.db.session.commit()
+        assert sorted(matches(fyyur.Venue, 'zyzzyva')) == ['Zyzzyva Hall', 'Zyzzyva Lounge']
+
+
+def test_rolled_back_changes_stay_out_of_autocomplete(app, database, client, new_venue):
+    assert client.get('/autocomplete?type=venues&q=zyzzyva').get_json() == {'venues': []}
+    with app.app_context():
+        fyyur.db.session.add(new_venue('Zyzzyva Lounge'))
+        fyyur.db.session.flush()
+        fyyur.db.session.rollback()
+    assert client.get('/autocomplete?type=venues&q=zyzzyva').get_json() == {'venues': []}
+
+    with app.app_context():
+        fyyur.db.session.add(new_venue('Zyzzyva Lounge'))
+        fyyur.db.session.commit()
+    names = [venue['name'] for venue in client.get('/autocomplete?type=venues&q=zyzzyva').get_json()['venues']]
+    assert names == ['Zyzzyva Lounge']
+
+
+def test_search_while_the_index_changes():
+    index = NgramIndex()
+    for id in range(2000):
+        index.add(id, 'Venue {}'.format(id))
+
+    def write(i):
+        index.discard(i % 2000)
+        index.add(2000 + i, 'Venue {}'.format(i))
+
+    assert concurrently(write, lambda: (index.search('ve'), index.search('venue 1'))) == []
+
+
+def test_complete_while_the_index_changes():
+    index = PrefixIndex((id, 'Venue {}'.format(id)) for id in range(2000))
+
+    def write(i):
+        index.discard(i % 2000)
+        index.add(2000 + i, 'Venue {}'.format(i))
+
+    assert concurrently(write, lambda: index.complete('venue', limit=500)) == []